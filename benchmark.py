@@ -0,0 +1,578 @@
+"""Offline benchmarks for the downloaders.
+
+Everything runs against in-process fakes or the local mock_instagram server,
+so no network access or Instagram account is needed. Each measured run
+happens in its own subprocess so the reported peak RSS belongs to it alone.
+
+    python benchmark.py suite                      # enumerate, profile, post and bulk scenarios
+    python benchmark.py suite --save baseline.json
+    python benchmark.py suite --baseline baseline.json
+    python benchmark.py pipeline --items 10000     # streaming vs collect-first download_profile
+    python benchmark.py parse --items 50000        # feed parser time and memory
+    python benchmark.py write --size 200M          # CPU per GB of the download write path
+    python benchmark.py segments --size 40M        # large-video latency by number of parallel segments
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import gc
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Generator, List, Optional
+
+import requests
+
+from download_utils import download_to_file
+from media_variants import parse_policy
+from mock_instagram import MockConfig, MockInstagram, build_posts
+from profile_downloader_v2 import InstagramProfileDownloader, MediaItem, PostInfo, parse_feed_page
+from rate_limiter import BANDWIDTH, AdaptiveRateLimiter, parse_byte_rate
+from session_pool import SessionPool
+
+SCENARIOS = ('enumerate', 'profile', 'post', 'bulk')
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Keep per-item log lines out of the measurement"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def unthrottled_limiter() -> AdaptiveRateLimiter:
+    """Limiter loose enough that the code under test, not pacing, sets the speed"""
+    return AdaptiveRateLimiter({'api': (1000.0, 1.0, 1000.0, 1000, 1.0), 'cdn': (1000.0, 1.0, 1000.0, 1000, 1.0)})
+
+
+def run_in_subprocess(argv: List[str]) -> Dict:
+    """Run this script with argv in a fresh interpreter and parse its JSON result"""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__)] + argv,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# Synthetic pipeline benchmark (no HTTP at all)
+
+class SyntheticProfileDownloader(InstagramProfileDownloader):
+    """Profile downloader whose feed and CDN are simulated in-process"""
+
+    def __init__(self, download_dir: str, total_items: int, page_size: int,
+                 page_latency: float, download_latency: float):
+        super().__init__(download_dir)
+        self.total_items = total_items
+        self.page_size = page_size
+        self.page_latency = page_latency
+        self.download_latency = download_latency
+        self.first_file_at = None
+
+    def get_profile_media(self, username: str, limit: Optional[int] = None, since: Optional[Dict] = None,
+                          resume: Optional[Dict] = None) -> Generator[MediaItem, None, None]:
+        state = self.feed_state[username] = {'complete': False, 'user_id': '0'}
+        total = self.total_items if limit is None else min(limit, self.total_items)
+        for page, start in enumerate(range(0, total, self.page_size), 1):
+            time.sleep(self.page_latency)
+            state.update(page=page, page_cursor=str(start) if start else None, page_items=start)
+            for i in range(start, min(start + self.page_size, total)):
+                post = PostInfo(f"B{i:010d}", 1600000000 + i, f"caption {i} " * 20)
+                yield MediaItem(post, f"https://scontent.cdninstagram.com/v/{i}.jpg", is_video=i % 5 == 0)
+        state['complete'] = True
+
+    def download_media_item(self, media_item: MediaItem, username: str) -> bool:
+        time.sleep(self.download_latency)
+        if self.first_file_at is None:
+            self.first_file_at = time.perf_counter()
+        return True
+
+
+def eager_download_profile(downloader: InstagramProfileDownloader, username: str, max_workers: int):
+    """Collect-then-download strategy used before download_profile streamed its input"""
+    media_items = list(downloader.get_profile_media(username))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(downloader.download_media_item, item, username): item for item in media_items}
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+
+
+def run_pipeline(args) -> Dict:
+    """Run one download strategy on the synthetic profile"""
+    with tempfile.TemporaryDirectory() as download_dir:
+        downloader = SyntheticProfileDownloader(
+            download_dir, args.items, args.page_size, args.page_latency, args.download_latency
+        )
+        start = time.perf_counter()
+        with quiet():
+            if args.mode == 'eager':
+                eager_download_profile(downloader, 'benchmark', args.workers)
+            else:
+                downloader.download_profile('benchmark', max_workers=args.workers)
+        elapsed = time.perf_counter() - start
+
+    return {
+        'mode': args.mode,
+        'items': args.items,
+        'time_to_first_file_s': round(downloader.first_file_at - start, 3) if downloader.first_file_at else None,
+        'total_time_s': round(elapsed, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def pipeline_argv(args) -> List[str]:
+    return ['--items', str(args.items), '--page-size', str(args.page_size),
+            '--page-latency', str(args.page_latency), '--download-latency', str(args.download_latency),
+            '--workers', str(args.workers)]
+
+
+# Feed parser micro-benchmark
+
+@dataclass
+class LegacyMediaItem:
+    """MediaItem as it was before PostInfo, for comparison"""
+    shortcode: str
+    url: str
+    is_video: bool
+    date: datetime
+    caption: Optional[str]
+    media_id: Optional[str] = None
+    index: int = 0
+
+
+def legacy_parse_feed_page(items: List[Dict]) -> List[LegacyMediaItem]:
+    """Per-item conversion that get_profile_media used before parse_feed_page"""
+    media_items = []
+    for item in items:
+        for index, media in enumerate(item.get('carousel_media') or [item]):
+            is_video = bool(media.get('video_versions'))
+            if is_video:
+                media_url = media['video_versions'][0]['url']
+            else:
+                candidates = media.get('image_versions2', {}).get('candidates', [])
+                media_url = candidates[0]['url'] if candidates else None
+            if media_url:
+                media_items.append(LegacyMediaItem(
+                    shortcode=item['code'],
+                    url=media_url,
+                    is_video=is_video,
+                    date=datetime.fromtimestamp(item['taken_at']),
+                    caption=item.get('caption', {}).get('text') if item.get('caption') else None,
+                    media_id=str(media.get('id', '')) or None,
+                    index=index
+                ))
+    return media_items
+
+
+def measure_parser(parse, pages: List[List[Dict]]) -> Dict:
+    """Parse every page, keeping the results alive, and report time and retained memory"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    parsed = [parse(page) for page in pages]
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    items = sum(len(page) for page in parsed)
+    return {
+        'media_items': items,
+        'parse_s': round(elapsed, 3),
+        'us_per_page': round(elapsed / len(pages) * 1e6, 1),
+        'retained_mb': round(retained / 1e6, 2),
+        'bytes_per_item': round(retained / items),
+    }
+
+
+def run_parse(args):
+    # JSON round trip so the items look like a decoded API response, not shared template objects
+    feed = json.loads(json.dumps(build_posts(MockConfig(items=args.items))))
+    pages = [feed[i:i + args.page_size] for i in range(0, len(feed), args.page_size)]
+    # Timing under tracemalloc is inflated, so time without it first
+    for name, parse in (('legacy', legacy_parse_feed_page), ('parse_feed_page', parse_feed_page)):
+        start = time.perf_counter()
+        for page in pages:
+            parse(page)
+        untraced = time.perf_counter() - start
+        stats = measure_parser(parse, pages)
+        stats['parse_s'] = round(untraced, 3)
+        stats['us_per_page'] = round(untraced / len(pages) * 1e6, 1)
+        print(f"{name:>16}: " + ", ".join(f"{k} {v}" for k, v in stats.items()))
+
+
+# Write path CPU cost
+
+def legacy_download(session: requests.Session, url: str, filepath: str, chunk_size: int):
+    """Write loop download_to_file used before reading into reusable buffers"""
+    with session.get(url, stream=True, headers={'Accept-Encoding': 'identity'}) as response, \
+            open(filepath, 'wb') as f:
+        digest = hashlib.sha256()
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            f.write(chunk)
+            digest.update(chunk)
+
+
+def run_write(args):
+    """CPU seconds per GB spent by the downloading thread, which excludes the in-process mock server"""
+    size = int(args.size)
+    paths = {
+        'iter_content 8K': lambda session, url, path: legacy_download(session, url, path, 8192),
+        'iter_content 64K': lambda session, url, path: legacy_download(session, url, path, 65536),
+        'iter_content 1M': lambda session, url, path: legacy_download(session, url, path, 1024 * 1024),
+        'download_to_file': lambda session, url, path: download_to_file(session, url, path, segments=1),
+    }
+    config = MockConfig(items=1, video_every=1, carousel_every=0, video_size=size, cdn_latency=0.0)
+    with tempfile.TemporaryDirectory() as download_dir, MockInstagram(config) as server:
+        url = server._with_base(server.posts[0])['video_versions'][0]['url']
+        session = requests.Session()
+        for name, download in paths.items():
+            runs = []
+            for run in range(args.repeat):
+                path = os.path.join(download_dir, f'{run}.mp4')
+                start_cpu, start = time.thread_time(), time.perf_counter()
+                download(session, url, path)
+                runs.append((time.thread_time() - start_cpu, time.perf_counter() - start))
+                os.unlink(path)
+            cpu, elapsed = min(runs)
+            print(f"{name:>18}: {cpu / size * 1e9:.2f} CPU s/GB, {size / elapsed / 1e6:.0f} MB/s")
+
+    # Hashing is part of every path and sets the floor
+    buffer = bytearray(1024 * 1024)
+    digest = hashlib.sha256()
+    start_cpu = time.thread_time()
+    for _ in range(size // len(buffer)):
+        digest.update(buffer)
+    print(f"{'sha256 alone':>18}: {(time.thread_time() - start_cpu) / size * 1e9:.2f} CPU s/GB")
+
+
+def run_segments(args):
+    """Time to fetch one large video over connections capped at args.bandwidth, by segment count"""
+    size = int(args.size)
+    config = MockConfig(items=1, video_every=1, carousel_every=0, video_size=size,
+                        cdn_latency=args.cdn_latency, bandwidth=args.bandwidth)
+    with tempfile.TemporaryDirectory() as download_dir, MockInstagram(config) as server:
+        url = server._with_base(server.posts[0])['video_versions'][0]['url']
+        session = requests.Session()
+        for count in args.segments:
+            path = os.path.join(download_dir, f'{count}.mp4')
+            start = time.perf_counter()
+            download_to_file(session, url, path, segments=count, segment_threshold=1)
+            elapsed = time.perf_counter() - start
+            os.unlink(path)
+            print(f"{count:>3} segments: {elapsed:.2f}s, {size / elapsed / 1e6:.1f} MB/s")
+
+
+# Mock-server scenarios
+
+MOCK_OPTIONS = {
+    # option: (default, help)
+    'items': (300, "Posts in the mock profile"),
+    'posts': (30, "Posts fetched by the post scenario"),
+    'image_size': (150_000, "Bytes per image"),
+    'video_size': (2_000_000, "Bytes per video"),
+    'api_latency': (0.02, "Seconds per API response"),
+    'cdn_latency': (0.01, "Seconds before CDN response headers"),
+    'bandwidth': (0.0, "CDN bytes/second per connection (0 = unlimited)"),
+    'rate_429': (0.0, "Fraction of requests answered with 429"),
+    'workers': (3, "download_profile worker threads"),
+    'schedule': ('fifo', "download_profile schedule: fifo, sjf, lanes or fair"),
+    'post_workers': (8, "Worker threads of the post and bulk scenarios"),
+    'accounts': (1, "Pooled accounts the bulk scenario spreads posts over"),
+    'bandwidth_cap': (0.0, "Process-wide download cap in bytes/second (0 = off)"),
+    'quality': ('high', "Variant policy: high, low, preview, a width or WIDTHxHEIGHT"),
+}
+
+
+def add_mock_arguments(parser):
+    for name, (default, help_text) in MOCK_OPTIONS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default, help=help_text)
+    parser.add_argument('--real-rates', action='store_true', help="Use the production rate limits instead of none")
+
+
+def mock_argv(args) -> List[str]:
+    """Command-line flags that reproduce the mock settings of args"""
+    argv = []
+    for name in MOCK_OPTIONS:
+        argv += ['--' + name.replace('_', '-'), str(getattr(args, name))]
+    if args.real_rates:
+        argv.append('--real-rates')
+    return argv
+
+
+def mock_config(args) -> MockConfig:
+    return MockConfig(
+        items=args.items, image_size=args.image_size, video_size=args.video_size,
+        api_latency=args.api_latency, cdn_latency=args.cdn_latency,
+        bandwidth=args.bandwidth, rate_429=args.rate_429
+    )
+
+
+def make_profile_downloader(download_dir: str, server: MockInstagram, args) -> InstagramProfileDownloader:
+    limiter = AdaptiveRateLimiter() if args.real_rates else unthrottled_limiter()
+    downloader = InstagramProfileDownloader(download_dir, rate_limiter=limiter,
+                                            variant_policy=parse_policy(args.quality))
+    downloader.api_base = server.base_url
+    return downloader
+
+
+def make_session_pool(download_dir: str, server: MockInstagram, args) -> SessionPool:
+    """Pool of args.accounts mock accounts, each with its own limiter"""
+    pool = SessionPool(download_dir, variant_policy=parse_policy(args.quality))
+    for n in range(args.accounts):
+        downloader = pool.new_downloader(AdaptiveRateLimiter() if args.real_rates else unthrottled_limiter())
+        downloader.api_base = server.base_url
+        pool.add(f'mock{n}', downloader)
+    return pool
+
+
+def scenario_enumerate(server: MockInstagram, download_dir: str, args) -> Dict:
+    """Page through the whole mock feed with get_profile_media"""
+    downloader = make_profile_downloader(download_dir, server, args)
+    page_latencies = []
+
+    def record_latency(response, *hook_args, **hook_kwargs):
+        if '/feed/user/' in response.url:
+            page_latencies.append(response.elapsed.total_seconds())
+
+    downloader.session.hooks['response'].append(record_latency)
+    start = time.perf_counter()
+    with quiet():
+        items = sum(1 for _ in downloader.get_profile_media('mock'))
+    elapsed = time.perf_counter() - start
+    return {
+        'items': items,
+        'pages': len(page_latencies),
+        'elapsed_s': elapsed,
+        'items_per_s': items / elapsed,
+        'p50_ms': percentile(page_latencies, 50) * 1000 if page_latencies else None,
+        'p99_ms': percentile(page_latencies, 99) * 1000 if page_latencies else None,
+    }
+
+
+def scenario_profile(server: MockInstagram, download_dir: str, args) -> Dict:
+    """Enumerate and download the whole mock profile with download_profile"""
+    downloader = make_profile_downloader(download_dir, server, args)
+    latencies = []
+    finished_at = []
+    download_media_item = downloader.download_media_item
+
+    def timed_download(media_item, username):
+        item_start = time.perf_counter()
+        try:
+            return download_media_item(media_item, username)
+        finally:
+            latencies.append(time.perf_counter() - item_start)
+            finished_at.append(time.perf_counter() - start)
+
+    downloader.download_media_item = timed_download
+    start = time.perf_counter()
+    with quiet():
+        stats = downloader.download_profile('mock', max_workers=args.workers, schedule=args.schedule)
+    elapsed = time.perf_counter() - start
+    return {
+        'items': stats['completed'],
+        'failed': stats['failed'],
+        'elapsed_s': elapsed,
+        'items_per_s': stats['completed'] / elapsed,
+        'mb': server.stats['bytes_sent'] / 1e6,
+        'mb_per_s': server.stats['bytes_sent'] / elapsed / 1e6,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'half_time_items': sum(t <= elapsed / 2 for t in finished_at),  # What a run cut off halfway gets
+    }
+
+
+class MockPost(SimpleNamespace):
+    """Just the Post attributes _download_post reads"""
+
+    @property
+    def _iphone_struct(self) -> Dict:
+        # A media info request, as instaloader makes on first access
+        response = self.session.get(f'{self.api_base}/api/v1/media/{self.mediaid}/info/', timeout=30)
+        response.raise_for_status()
+        return response.json()['items'][0]
+
+
+def scenario_post(server: MockInstagram, download_dir: str, args) -> Dict:
+    """Fetch single posts through InstagramDownloader._download_post, post_workers at a time"""
+    try:
+        from instagram_downloader_v4 import InstagramDownloader
+    except ImportError as e:
+        return {'skipped': f"instagram_downloader_v4 unavailable: {e}"}
+
+    downloader = InstagramDownloader(download_dir)
+    downloader.quality = args.quality
+    if not args.real_rates:
+        downloader.rate_limiter = unthrottled_limiter()
+        downloader.session = make_profile_downloader(download_dir, server, args).session
+
+    posts = [server._with_base(post) for post in server.posts if 'carousel_media' not in post][:args.posts]
+    latencies = []
+
+    def download(post):
+        fake = MockPost(
+            shortcode=post['code'],
+            mediaid=int(post['id'].split('_')[0]),
+            date_local=datetime.fromtimestamp(post['taken_at']),
+            is_video=bool(post.get('video_versions')),
+            video_url=post['video_versions'][0]['url'] if post.get('video_versions') else None,
+            video_duration=post.get('video_duration'),
+            url=post['image_versions2']['candidates'][0]['url'],
+            session=downloader.session,
+            api_base=server.base_url,
+        )
+        post_start = time.perf_counter()
+        downloader._download_post(fake)
+        latencies.append(time.perf_counter() - post_start)
+
+    start = time.perf_counter()
+    with quiet(), concurrent.futures.ThreadPoolExecutor(max_workers=args.post_workers) as executor:
+        list(executor.map(download, posts))
+    elapsed = time.perf_counter() - start
+    return {
+        'items': len(posts),
+        'elapsed_s': elapsed,
+        'items_per_s': len(posts) / elapsed,
+        'mb': server.stats['bytes_sent'] / 1e6,
+        'mb_per_s': server.stats['bytes_sent'] / elapsed / 1e6,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'api_requests': server.stats['api_requests'],
+    }
+
+
+def scenario_bulk(server: MockInstagram, download_dir: str, args) -> Dict:
+    """Fetch a list of single posts at once, spread over a SessionPool of args.accounts accounts"""
+    pool = make_session_pool(download_dir, server, args)
+    shortcodes = [post['code'] for post in server.posts[:args.posts]]
+    start = time.perf_counter()
+    with quiet():
+        results = pool.download_posts(shortcodes, max_workers=args.post_workers)
+    elapsed = time.perf_counter() - start
+    latencies = [r['elapsed_s'] for r in results.values()]
+    return {
+        'items': sum(r['status'] == 'ok' for r in results.values()),
+        'failed': sum(r['status'] == 'failed' for r in results.values()),
+        'elapsed_s': elapsed,
+        'items_per_s': len(results) / elapsed,
+        'mb': server.stats['bytes_sent'] / 1e6,
+        'mb_per_s': server.stats['bytes_sent'] / elapsed / 1e6,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def run_scenario(args) -> Dict:
+    scenario = {'enumerate': scenario_enumerate, 'profile': scenario_profile, 'post': scenario_post,
+                'bulk': scenario_bulk}[args.scenario]
+    if args.bandwidth_cap:
+        BANDWIDTH.configure(args.bandwidth_cap)
+    with tempfile.TemporaryDirectory() as download_dir, MockInstagram(mock_config(args)) as server:
+        result = scenario(server, download_dir, args)
+        result['throttled'] = server.stats['throttled']
+    result['peak_rss_mb'] = peak_rss_mb()
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}
+
+
+def format_change(value, baseline) -> str:
+    if not isinstance(value, (int, float)) or not isinstance(baseline, (int, float)) or not baseline:
+        return ''
+    return f" ({(value - baseline) / baseline * 100:+.1f}%)"
+
+
+def run_suite(args):
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    for scenario in args.scenarios or SCENARIOS:
+        results[scenario] = stats = run_in_subprocess(['run', scenario] + mock_argv(args))
+        print(f"\n{scenario}")
+        for key, value in stats.items():
+            print(f"  {key:>14}: {value}{format_change(value, baseline.get(scenario, {}).get(key))}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline downloader benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    suite = commands.add_parser('suite', help="Run scenarios against the mock server and report them")
+    suite.add_argument('--scenarios', nargs='+', choices=SCENARIOS, help="Subset of scenarios to run")
+    suite.add_argument('--save', help="Write results to this JSON file")
+    suite.add_argument('--baseline', help="Compare against results saved with --save")
+    add_mock_arguments(suite)
+
+    run = commands.add_parser('run', help="Run one scenario in this process and print JSON")
+    run.add_argument('scenario', choices=SCENARIOS)
+    add_mock_arguments(run)
+
+    pipeline = commands.add_parser('pipeline', help="Compare streaming and collect-first download_profile")
+    pipeline.add_argument('--items', type=int, default=10000, help="Number of media items in the profile")
+    pipeline.add_argument('--page-size', type=int, default=12, help="Items per feed page")
+    pipeline.add_argument('--page-latency', type=float, default=0.02, help="Seconds per feed page request")
+    pipeline.add_argument('--download-latency', type=float, default=0.001, help="Seconds per media download")
+    pipeline.add_argument('--workers', type=int, default=3, help="Download worker threads")
+    pipeline.add_argument('--mode', choices=['streaming', 'eager'], help="Run a single mode in this process")
+
+    parse = commands.add_parser('parse', help="Time and size feed parsing on a large synthetic feed")
+    parse.add_argument('--items', type=int, default=50000, help="Posts in the feed")
+    parse.add_argument('--page-size', type=int, default=33, help="Posts per feed page")
+
+    write = commands.add_parser('write', help="CPU per GB of the download write path, before and after")
+    write.add_argument('--size', type=parse_byte_rate, default=200e6, help="Bytes of the test video, e.g. 200M")
+    write.add_argument('--repeat', type=int, default=3, help="Runs per write path; the lowest CPU time counts")
+
+    segments = commands.add_parser('segments', help="Large-video download time by number of parallel segments")
+    segments.add_argument('--size', type=parse_byte_rate, default=40e6, help="Bytes of the test video, e.g. 40M")
+    segments.add_argument('--bandwidth', type=parse_byte_rate, default=10e6, help="CDN bytes/second per connection")
+    segments.add_argument('--cdn-latency', type=float, default=0.05, help="Seconds before CDN response headers")
+    segments.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4, 8], help="Segment counts to try")
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        print(json.dumps(run_scenario(args)))
+    elif args.command == 'suite':
+        run_suite(args)
+    elif args.command == 'parse':
+        run_parse(args)
+    elif args.command == 'write':
+        run_write(args)
+    elif args.command == 'segments':
+        run_segments(args)
+    elif args.mode:
+        print(json.dumps(run_pipeline(args)))
+    else:
+        # Run each mode in a fresh interpreter so ru_maxrss is not shared between them
+        for mode in ('eager', 'streaming'):
+            stats = run_in_subprocess(['pipeline', '--mode', mode] + pipeline_argv(args))
+            print(f"{mode:>10}: first file after {stats['time_to_first_file_s']}s, "
+                  f"total {stats['total_time_s']}s, peak RSS {stats['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Headless batch downloader.
+
+Downloads every profile and post listed in a text file using one logged-in
+session for the whole batch, and writes a JSON summary for cron jobs.
+
+    python cli.py targets.txt --username me --parallel 4
+
+The targets file holds one profile name, profile URL or post/reel URL per
+line; blank lines and lines starting with # are ignored. The password is
+read from the IG_PASSWORD environment variable or prompted for.
+
+With --accounts, the batch is spread over several logins instead: the file
+holds one username or username:password per line, and accounts listed
+without a password use their saved session. Each account gets its own rate
+budget, and accounts that are throttled or checkpointed are rotated out.
+"""
+import argparse
+import concurrent.futures
+import getpass
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import download_utils
+import metrics
+from download_scheduler import DownloadScheduler
+from instagram_downloader_v4 import InstagramDownloader
+from media_variants import parse_policy
+from rate_limiter import BANDWIDTH, parse_byte_rate
+from session_pool import SessionPool
+
+
+def read_targets(path: str, downloader: InstagramDownloader) -> List[Tuple[str, str, str]]:
+    """Parse a targets file into (kind, key, original line) tuples, dropping duplicates"""
+    targets = []
+    seen = set()
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if shortcode := downloader._extract_shortcode_from_url(line):
+            target = ('post', shortcode, line)
+        elif 'instagram.com' in line:
+            username = downloader._extract_username_from_url(line)
+            if not username:
+                print(f"Skipping unrecognised URL: {line}")
+                continue
+            target = ('profile', username, line)
+        else:
+            target = ('profile', line.lstrip('@').strip('/'), line)
+
+        if target[:2] not in seen:
+            seen.add(target[:2])
+            targets.append(target)
+    return targets
+
+
+def read_accounts(path: str) -> List[Tuple[str, Optional[str]]]:
+    """Parse an accounts file into (username, password or None) tuples"""
+    accounts = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        username, _, password = line.partition(':')
+        accounts.append((username.strip().lstrip('@'), password or None))
+    return accounts
+
+
+def login_pool(args, accounts: List[Tuple[str, Optional[str]]]) -> Optional[SessionPool]:
+    """Sign in every (username, password) account; None if none of them could be used"""
+    pool = SessionPool(args.download_dir, variant_policy=parse_policy(args.quality))
+    for username, password in accounts:
+        pool.login(username, password)
+    if not pool.accounts:
+        print("None of the accounts could be logged in")
+        return None
+    print(f"Logged in {len(pool.accounts)} accounts")
+    return pool
+
+
+def run_target(downloader: Optional[InstagramDownloader], kind: str, key: str, args,
+               pool: Optional[SessionPool] = None) -> Dict:
+    """Download one target and describe the outcome; with a pool, downloader is not used"""
+    result = {'target': key, 'type': kind, 'status': 'ok'}
+    start = time.monotonic()
+    try:
+        if kind == 'post' and pool:
+            outcome = pool.download_post(key)
+            result['files'] = outcome['files']
+            if outcome['status'] == 'failed':
+                raise RuntimeError(outcome['error'])
+        elif kind == 'post':
+            files = downloader.download_post(f'https://www.instagram.com/p/{key}/')
+            result['files'] = [str(f) for f in files]
+        else:
+            options = dict(limit=args.limit, max_workers=args.workers, sync=args.sync, schedule=args.schedule)
+            if pool:
+                stats = pool.download_profile(key, **options)
+            else:
+                stats = downloader.get_profile_downloader().download_profile(key, **options)
+            result.update(stats or {})
+            if stats and stats['failed']:
+                result['status'] = 'partial'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['elapsed_s'] = round(time.monotonic() - start, 2)
+    return result
+
+
+def run_posts(downloader: InstagramDownloader, shortcodes: List[str], args,
+              pool: Optional[SessionPool] = None) -> List[Dict]:
+    """Download every listed post as one concurrent batch"""
+    try:
+        if pool:
+            outcomes = list(pool.download_posts(shortcodes, max_workers=args.post_workers).values())
+        else:
+            outcomes = downloader.download_posts(
+                [f'https://www.instagram.com/p/{shortcode}/' for shortcode in shortcodes],
+                max_workers=args.post_workers
+            )
+    except Exception as e:
+        return [{'target': shortcode, 'type': 'post', 'status': 'failed', 'error': str(e)} for shortcode in shortcodes]
+
+    results = []
+    for outcome in outcomes:
+        result = {'target': outcome.get('shortcode'), 'type': 'post', 'status': outcome['status'],
+                  'files': outcome.get('files', [])}
+        if 'error' in outcome:
+            result['error'] = outcome['error']
+        if 'elapsed_s' in outcome:
+            result['elapsed_s'] = outcome['elapsed_s']
+        results.append(result)
+    return results
+
+
+def add_download_options(parser: argparse.ArgumentParser):
+    """Options shared by cli.py and worker.py that shape how media is fetched and written"""
+    parser.add_argument('--workers', type=int, default=3, help="Download threads per profile")
+    parser.add_argument('--schedule', choices=DownloadScheduler.POLICIES, default='fifo',
+                        help="Order of a profile's downloads: feed order, smallest first, video lanes or fair")
+    parser.add_argument('--limit', type=int, help="Maximum media items per profile")
+    parser.add_argument('--sync', action='store_true', help="Only fetch posts newer than the last complete run")
+    parser.add_argument('--quality', default='high',
+                        help="Rendition to fetch: high, low, preview, a maximum width or WIDTHxHEIGHT")
+    parser.add_argument('--max-bandwidth', type=parse_byte_rate,
+                        help="Cap on download bytes/second across all workers, e.g. 800K or 5M")
+    parser.add_argument('--bandwidth-burst', type=parse_byte_rate, help="Bytes allowed at once (default: one second)")
+    parser.add_argument('--fsync-every', type=parse_byte_rate,
+                        help="fsync downloads every this many bytes, e.g. 64M (default: leave it to the OS)")
+    parser.add_argument('--segments', type=int, default=download_utils.SEGMENTS,
+                        help="Parallel byte ranges per large file (1 = one connection per file)")
+    parser.add_argument('--segment-threshold', type=parse_byte_rate, default=download_utils.SEGMENT_THRESHOLD,
+                        help="Files at least this large are fetched in segments, e.g. 16M")
+
+
+def apply_download_options(args):
+    """Check the options of add_download_options and apply the process-wide ones; ValueError if invalid"""
+    parse_policy(args.quality)
+    if args.max_bandwidth:
+        BANDWIDTH.configure(args.max_bandwidth, args.bandwidth_burst)
+    if args.fsync_every:
+        download_utils.FSYNC_EVERY = int(args.fsync_every)
+    download_utils.SEGMENTS = max(1, args.segments)
+    download_utils.SEGMENT_THRESHOLD = int(args.segment_threshold)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Download Instagram profiles and posts in batch without the GUI")
+    parser.add_argument('targets', help="File with one profile name, profile URL or post URL per line")
+    parser.add_argument('--username', default=os.environ.get('IG_USERNAME'), help="Instagram login (or IG_USERNAME)")
+    parser.add_argument('--accounts', help="File with one username or username:password per line to spread "
+                                           "the batch over several accounts")
+    parser.add_argument('--download-dir', default='downloads', help="Where to save media")
+    parser.add_argument('--parallel', type=int, default=2, help="Profiles downloaded at the same time")
+    parser.add_argument('--post-workers', type=int, default=8, help="Single posts downloaded at the same time")
+    add_download_options(parser)
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port during the run")
+    parser.add_argument('--metrics-json', help="Write a JSON snapshot of the metrics here when the run ends")
+    parser.add_argument('--summary', help="JSON summary path (default: <download-dir>/batch_summary.json)")
+    args = parser.parse_args(argv)
+
+    if not args.username and not args.accounts:
+        parser.error("--username, IG_USERNAME or --accounts is required")
+    if not args.accounts:
+        password = os.environ.get('IG_PASSWORD') or getpass.getpass(f"Password for {args.username}: ")
+
+    try:
+        apply_download_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    downloader = InstagramDownloader(args.download_dir)
+    downloader.quality = args.quality
+    targets = read_targets(args.targets, downloader)
+    if not targets:
+        print("No targets to download")
+        return 0
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+
+    started_at = datetime.now()
+    pool = None
+    if args.accounts:
+        pool = login_pool(args, read_accounts(args.accounts))
+        if not pool:
+            return 2
+    elif not downloader.login(args.username, password):
+        return 2
+
+    posts = [t for t in targets if t[0] == 'post']
+    profiles = [t for t in targets if t[0] == 'profile']
+    results = []
+
+    # Profiles run side by side on the shared, already authenticated session (or the pool's accounts)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        futures = [executor.submit(run_target, downloader, kind, key, args, pool) for kind, key, _ in profiles]
+        if posts:
+            results.extend(run_posts(downloader, [key for _, key, _ in posts], args, pool))
+        for future in concurrent.futures.as_completed(futures):
+            results.append(future.result())
+
+    summary = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'targets': len(results),
+        'ok': sum(r['status'] == 'ok' for r in results),
+        'partial': sum(r['status'] == 'partial' for r in results),
+        'failed': sum(r['status'] == 'failed' for r in results),
+        'results': results,
+    }
+    if pool:
+        summary['accounts'] = pool.status()
+    summary_path = Path(args.summary) if args.summary else downloader.download_dir / 'batch_summary.json'
+    summary_path.write_text(json.dumps(summary, indent=2), encoding='utf-8')
+    if args.metrics_json:
+        metrics.REGISTRY.write_json(args.metrics_json)
+    print(f"\n{summary['ok']} ok, {summary['partial']} partial, {summary['failed']} failed. Summary written to {summary_path}")
+
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+# Sizes assumed until the scheduler has seen a download of the kind finish
+DEFAULT_IMAGE_BYTES = 250_000
+DEFAULT_VIDEO_BYTES = 5_000_000
+
+# Upper bounds of the size classes the 'fair' policy rotates between
+FAIR_CLASSES = (1_000_000, 20_000_000)
+
+
+class DownloadScheduler:
+    """Bounded work queue between feed enumeration and download workers.
+
+    Decides which queued media item a free worker takes next:
+
+    fifo   feed order (the old behaviour)
+    sjf    smallest estimated size first, so small files aren't stuck behind reels
+    lanes  at most video_slots workers on videos at once; the rest keep on images
+    fair   round robin over size classes (small, medium, large), feed order within each
+
+    Sizes come from MediaItem.size_hint (the feed's video dimensions and
+    duration) or else from the average size of finished downloads of the
+    same kind, which the workers report back through done().
+    """
+
+    POLICIES = ('fifo', 'sjf', 'lanes', 'fair')
+
+    def __init__(self, policy: str = 'fifo', maxsize: int = 50, workers: int = 3,
+                 video_slots: Optional[int] = None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown schedule {policy!r}: use one of {', '.join(self.POLICIES)}")
+        self.policy = policy
+        self.maxsize = maxsize
+        self.video_slots = video_slots if video_slots is not None else max(1, workers // 3)
+        self.active_videos = 0
+        self._queued = 0
+        self._closed = False
+        self._order = itertools.count()
+        self._heap = []  # sjf: (estimated size, sequence, item, payload)
+        self._lanes = {}  # Lane key -> deque of (item, payload)
+        self._turn = 0  # fair: index of the size class to serve next
+        self._learned: Dict[bool, Tuple[int, int]] = {}  # is_video -> (files, bytes) of finished downloads
+        self._cond = threading.Condition()
+
+    def estimate(self, item) -> int:
+        """Expected bytes of a media item"""
+        if item.size_hint:
+            return item.size_hint
+        files, total = self._learned.get(item.is_video, (0, 0))
+        if files:
+            return total // files
+        return DEFAULT_VIDEO_BYTES if item.is_video else DEFAULT_IMAGE_BYTES
+
+    def _lane(self, item):
+        if self.policy == 'lanes':
+            return item.is_video
+        if self.policy == 'fair':
+            size = self.estimate(item)
+            return next((i for i, bound in enumerate(FAIR_CLASSES) if size <= bound), len(FAIR_CLASSES))
+        return None
+
+    def put(self, item, payload: Any = None):
+        """Queue a media item, blocking while maxsize items are waiting"""
+        with self._cond:
+            while self._queued >= self.maxsize:
+                self._cond.wait()
+            if self.policy == 'sjf':
+                heapq.heappush(self._heap, (self.estimate(item), next(self._order), item, payload))
+            else:
+                self._lanes.setdefault(self._lane(item), deque()).append((item, payload))
+            self._queued += 1
+            self._cond.notify_all()
+
+    def _take(self):
+        if self.policy == 'sjf':
+            _, _, item, payload = heapq.heappop(self._heap)
+            return item, payload
+        if self.policy == 'lanes':
+            images, videos = self._lanes.get(False), self._lanes.get(True)
+            # A free video slot goes to a video; otherwise images first, videos only when no image waits
+            if videos and (self.active_videos < self.video_slots or not images):
+                return videos.popleft()
+            return images.popleft()
+        if self.policy == 'fair':
+            classes = len(FAIR_CLASSES) + 1
+            for step in range(classes):
+                lane = self._lanes.get((self._turn + step) % classes)
+                if lane:
+                    self._turn = (self._turn + step + 1) % classes
+                    return lane.popleft()
+        return self._lanes[None].popleft()
+
+    def get(self) -> Optional[Tuple[Any, Any]]:
+        """Next (item, payload) for a worker, or None once the queue is closed and drained"""
+        with self._cond:
+            while not self._queued:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            item, payload = self._take()
+            self._queued -= 1
+            if item.is_video:
+                self.active_videos += 1
+            self._cond.notify_all()
+            return item, payload
+
+    def done(self, item, size: Optional[int] = None):
+        """Report a finished item and, if it was downloaded, its size"""
+        with self._cond:
+            if item.is_video:
+                self.active_videos -= 1
+            if size:
+                files, total = self._learned.get(item.is_video, (0, 0))
+                self._learned[item.is_video] = (files + 1, total + size)
+
+    def close(self):
+        """No more items will be put; workers get None once the queue is empty"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,400 @@
+import concurrent.futures
+import ctypes
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+import urllib3
+
+from rate_limiter import BANDWIDTH, BandwidthLimiter
+
+# Bytes read from the socket per call; each thread reuses one buffer of this size
+BUFFER_SIZE = 1024 * 1024
+
+# Bytes written between fsyncs of a .part file; None leaves writeback to the OS
+FSYNC_EVERY: Optional[int] = None
+
+# Smaller files aren't worth a preallocation call
+PREALLOCATE_MIN = 1024 * 1024
+
+# Files at least this large are fetched as SEGMENTS byte ranges at once, if the server takes Range requests
+SEGMENT_THRESHOLD = 16 * 1024 * 1024
+SEGMENTS = 4
+
+_FALLOC_FL_KEEP_SIZE = 1
+_buffers = threading.local()
+
+
+@dataclass
+class DownloadResult:
+    path: Path
+    size: int
+    sha256: str
+
+
+def part_path(filepath: Path) -> Path:
+    """Path of the staging file used while filepath is downloading"""
+    return filepath.with_name(filepath.name + '.part')
+
+
+def segments_path(filepath: Path) -> Path:
+    """Path of the progress record kept while filepath is downloading in segments"""
+    return filepath.with_name(filepath.name + '.part.segments')
+
+
+class _FileChanged(IOError):
+    """The server's copy no longer has the size a segmented download was planned for"""
+
+
+def _content_range_total(content_range: Optional[str]) -> Optional[int]:
+    """Total size from a Content-Range header such as 'bytes 100-199/2000' or 'bytes */2000'"""
+    if content_range and (match := re.search(r'/(\d+)\s*$', content_range)):
+        return int(match.group(1))
+    return None
+
+
+def hash_file(filepath: Path, chunk_size: int = 1024 * 1024):
+    """SHA-256 hash object fed with the contents of a file, ready for further updates"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest
+
+
+def _fallocate():
+    """libc fallocate(2), or None where it isn't available"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        fallocate = ctypes.CDLL(None, use_errno=True).fallocate
+    except (OSError, AttributeError):
+        return None
+    fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+    return fallocate
+
+
+_libc_fallocate = _fallocate()
+
+
+def preallocate(fd: int, offset: int, length: int) -> bool:
+    """Reserve disk blocks for length bytes at offset without changing the file size.
+
+    Resuming reads the size of the .part file, so it has to keep matching
+    the bytes actually written; os.posix_fallocate would extend it. Returns
+    False where the platform or filesystem can't do this.
+    """
+    if _libc_fallocate is None or length <= 0:
+        return False
+    return _libc_fallocate(fd, _FALLOC_FL_KEEP_SIZE, offset, length) == 0
+
+
+def _buffer(size: int) -> memoryview:
+    """This thread's reusable read buffer"""
+    buffer = getattr(_buffers, 'view', None)
+    if buffer is None or len(buffer) != size:
+        buffer = _buffers.view = memoryview(bytearray(size))
+    return buffer
+
+
+def _body_chunks(response: requests.Response, chunk_size: int, bandwidth: BandwidthLimiter):
+    """Body of a streamed response, read into a reused buffer unless it is encoded.
+
+    While bandwidth is limited, reads are no larger than its burst, so a
+    slow limit is met with steady small reads rather than a large read
+    followed by a long wait. Each chunk is only valid until the next one
+    is read.
+    """
+    if bandwidth.rate:
+        chunk_size = max(1, min(chunk_size, int(bandwidth.burst)))
+    if response.headers.get('Content-Encoding', 'identity') != 'identity':
+        # Left to requests, which decodes
+        yield from response.iter_content(chunk_size=chunk_size)
+        return
+    raw = response.raw
+    buffer = _buffer(chunk_size)
+    while n := raw.readinto(buffer):
+        yield buffer[:n]
+
+
+def write_body(response: requests.Response, f, digest, bandwidth: BandwidthLimiter,
+               chunk_size: int = BUFFER_SIZE, fsync_every: Optional[int] = None) -> int:
+    """Stream a response body into the unbuffered file f, hashing it on the way; returns the bytes written"""
+    written = unsynced = 0
+    for chunk in _body_chunks(response, chunk_size, bandwidth):
+        view = memoryview(chunk)
+        while view:
+            view = view[f.write(view):]
+        digest.update(chunk)
+        bandwidth.consume(len(chunk))
+        written += len(chunk)
+        unsynced += len(chunk)
+        if fsync_every and unsynced >= fsync_every:
+            os.fsync(f.fileno())
+            unsynced = 0
+    if fsync_every and unsynced:
+        os.fsync(f.fileno())
+    return written
+
+
+def plan_segments(total: int, count: int) -> Dict:
+    """Split total bytes into count byte ranges, recorded as [start, end, bytes done]"""
+    size = -(-total // count)
+    return {'total': total, 'segments': [[start, min(total, start + size), 0] for start in range(0, total, size)]}
+
+
+def _load_plan(state: Path) -> Optional[Dict]:
+    """Progress record of a segmented download, or None if it is unreadable"""
+    try:
+        plan = json.loads(state.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(plan, dict) or not isinstance(plan.get('total'), int) or not plan.get('segments'):
+        return None
+    return plan
+
+
+def _allocate(fd: int, size: int):
+    """Give a file its full size, reserving the disk blocks where the platform allows"""
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # E.g. a filesystem without fallocate support
+    os.ftruncate(fd, size)
+
+
+def _download_segmented(session: requests.Session, url: str, filepath: Path, plan: Dict, timeout: float,
+                        max_attempts: int, bandwidth: BandwidthLimiter, fsync_every: Optional[int],
+                        first: Optional[requests.Response] = None) -> DownloadResult:
+    """Fetch the byte ranges of plan in parallel, writing each into place in the .part file.
+
+    Every segment is retried on its own, up to max_attempts times, from the
+    last byte it wrote. Progress is recorded next to the .part file so an
+    interrupted download resumes its unfinished segments. first, a response
+    already streaming the file from byte 0, serves the first segment.
+    """
+    part, state = part_path(filepath), segments_path(filepath)
+    total = plan['total']
+    lock = threading.Lock()
+
+    def save():
+        with lock:
+            record = state.with_name(state.name + '.tmp')
+            record.write_text(json.dumps(plan), encoding='utf-8')
+            os.replace(record, state)
+
+    def fetch(segment, response=None):
+        start, end = segment[0], segment[1]
+        last_error = None
+        for _ in range(max_attempts):
+            position = start + segment[2]
+            if position >= end:
+                return
+            try:
+                if response is None:
+                    response = session.get(url, stream=True, timeout=timeout, headers={
+                        'Accept-Encoding': 'identity', 'Range': f'bytes={position}-{end - 1}'
+                    })
+                with response:
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        if _content_range_total(response.headers.get('Content-Range')) != total:
+                            raise _FileChanged(f"{filepath.name} changed on the server while downloading")
+                    elif position:
+                        raise IOError(f"Server ignored the Range request for {filepath.name}")
+                    for chunk in _body_chunks(response, BUFFER_SIZE, bandwidth):
+                        view = memoryview(chunk)[:end - position]
+                        while view:
+                            written = os.pwrite(fd, view, position)
+                            view = view[written:]
+                            position += written
+                        bandwidth.consume(len(chunk))
+                        segment[2] = position - start
+                        if position >= end:
+                            break
+                if position >= end:
+                    save()
+                    return
+                last_error = IOError(f"Segment {start}-{end - 1} of {filepath.name} ended early")
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and 400 <= status < 500 and status != 429:
+                    raise
+                last_error = e
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    urllib3.exceptions.HTTPError) as e:
+                last_error = e
+            finally:
+                response = None
+            save()
+        raise last_error or IOError(f"Failed to download segment {start}-{end - 1} of {filepath.name}")
+
+    if first is not None:
+        # The record has to exist before the .part file has its full size, or resume would trust it
+        save()
+        fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        _allocate(fd, total)
+    else:
+        fd = os.open(part, os.O_WRONLY)
+
+    errors = []
+    try:
+        pending = [segment for segment in plan['segments'] if segment[2] < segment[1] - segment[0]]
+        if first is not None and pending and pending[0][0] == 0:
+            head, rest = pending[0], pending[1:]
+        else:
+            head, rest = None, pending
+            if first is not None:
+                first.close()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(rest))) as executor:
+            futures = [executor.submit(fetch, segment) for segment in rest]
+            if head is not None:
+                try:
+                    fetch(head, first)
+                except Exception as e:
+                    errors.append(e)
+            for future in futures:
+                if future.exception() is not None:
+                    errors.append(future.exception())
+        if fsync_every and not errors:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    if any(isinstance(e, _FileChanged) for e in errors):
+        part.unlink(missing_ok=True)
+        state.unlink(missing_ok=True)
+    if errors:
+        raise errors[0]
+
+    done = sum(segment[2] for segment in plan['segments'])
+    size = part.stat().st_size
+    if done != total or size != total:
+        raise IOError(f"Incomplete download of {filepath.name} ({done}/{total} bytes in a {size} byte file)")
+    digest = hash_file(part)
+    os.replace(part, filepath)
+    state.unlink(missing_ok=True)
+    return DownloadResult(filepath, total, digest.hexdigest())
+
+
+def download_to_file(session: requests.Session, url: str, filepath: Path, chunk_size: int = BUFFER_SIZE,
+                     max_attempts: int = 3, timeout: float = 60.0,
+                     bandwidth: Optional[BandwidthLimiter] = None,
+                     fsync_every: Optional[int] = None, segments: Optional[int] = None,
+                     segment_threshold: Optional[int] = None) -> DownloadResult:
+    """Download url to filepath, staging the bytes in a .part file.
+
+    An existing .part file is resumed with a Range request, and interrupted
+    transfers are resumed the same way up to max_attempts times. The .part
+    file is renamed onto filepath only once its size matches the size the
+    server reported. The SHA-256 of the content is computed as it streams in.
+    Every chunk is paced by bandwidth, the process-wide BANDWIDTH by default.
+
+    The body is read chunk_size bytes at a time into a per-thread buffer and
+    written without further copies; disk space for the announced length is
+    reserved up front. With fsync_every (default FSYNC_EVERY) the file is
+    synced after every that many bytes and before the rename.
+
+    A new download of at least segment_threshold bytes (default
+    SEGMENT_THRESHOLD) from a server that accepts Range requests is split
+    into segments byte ranges (default SEGMENTS) fetched in parallel, so one
+    connection's throughput doesn't cap a large video.
+    """
+    filepath = Path(filepath)
+    bandwidth = bandwidth or BANDWIDTH
+    fsync_every = fsync_every if fsync_every is not None else FSYNC_EVERY
+    segments = segments if segments is not None else SEGMENTS
+    segment_threshold = segment_threshold if segment_threshold is not None else SEGMENT_THRESHOLD
+    part = part_path(filepath)
+    state = segments_path(filepath)
+    last_error = None
+
+    for _ in range(max_attempts):
+        if state.exists():
+            plan = _load_plan(state) if part.exists() else None
+            if plan is not None:
+                return _download_segmented(session, url, filepath, plan, timeout, max_attempts, bandwidth,
+                                           fsync_every)
+            # Without its record a full-size segmented .part file can't be trusted
+            part.unlink(missing_ok=True)
+            state.unlink(missing_ok=True)
+
+        offset = part.stat().st_size if part.exists() else 0
+        # Byte offsets only line up with the file on disk if the body is not content-encoded
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+
+        try:
+            with session.get(url, stream=True, headers=headers, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Nothing left to fetch past offset; trust the .part file only if it matches the real size
+                    total = _content_range_total(response.headers.get('Content-Range'))
+                    if total is not None and total == offset:
+                        digest = hash_file(part)
+                        os.replace(part, filepath)
+                        return DownloadResult(filepath, offset, digest.hexdigest())
+                    part.unlink(missing_ok=True)
+                    last_error = IOError(f"Discarded stale partial download of {filepath.name}")
+                    continue
+
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    total = _content_range_total(response.headers.get('Content-Range'))
+                    mode = 'ab'
+                    digest = hash_file(part)
+                else:
+                    # Server ignored the Range header and is sending the whole file
+                    content_length = response.headers.get('Content-Length')
+                    total = int(content_length) if content_length else None
+                    mode = 'wb'
+                    offset = 0
+                    digest = hashlib.sha256()
+
+                if response.headers.get('Content-Encoding', 'identity') != 'identity':
+                    # Decoded body size won't match the encoded length the server reported
+                    total = None
+
+                if (mode == 'wb' and total is not None and segments > 1 and total >= segment_threshold
+                        and response.headers.get('Accept-Ranges') == 'bytes'):
+                    return _download_segmented(session, url, filepath, plan_segments(total, segments), timeout,
+                                               max_attempts, bandwidth, fsync_every, first=response)
+
+                with open(part, mode, buffering=0) as f:
+                    if total is not None and total - offset >= PREALLOCATE_MIN:
+                        preallocate(f.fileno(), offset, total - offset)
+                    write_body(response, f, digest, bandwidth, chunk_size, fsync_every)
+
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and 400 <= status < 500 and status != 429:
+                raise
+            last_error = e
+            continue
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                urllib3.exceptions.HTTPError) as e:
+            # Keep the .part file so the next attempt picks up where this one stopped
+            last_error = e
+            continue
+
+        size = part.stat().st_size
+        if total is None or size == total:
+            os.replace(part, filepath)
+            return DownloadResult(filepath, size, digest.hexdigest())
+        if size > total:
+            part.unlink()
+            last_error = IOError(f"Partial download of {filepath.name} is larger than expected ({size} > {total} bytes)")
+        else:
+            last_error = IOError(f"Incomplete download of {filepath.name} ({size}/{total} bytes)")
+
+    raise last_error or IOError(f"Failed to download {filepath.name}")
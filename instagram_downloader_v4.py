@@ -1,63 +1,140 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
 from pathlib import Path
 import threading
+import concurrent.futures
 import instaloader
 import re
-from typing import Optional, List
-from datetime import datetime
+from typing import Callable, Optional, List, Dict, Tuple
 import requests
 import sys
 import io
-from PIL import Image, ImageTk
-import queue
 import time
+from collections import deque
+import os
+import shutil
+import weakref
 from random import uniform
 from profile_downloader_v2 import InstagramProfileDownloader  # Import our new profile downloader
+from download_utils import download_to_file, hash_file
+from manifest import DownloadManifest
+from media_store import MediaStore
+from media_variants import ORIGINAL, parse_policy, select_variant
+from metadata_cache import MetadataCache, POST_TTL
+from metrics import LOGINS, MEDIA, MEDIA_BYTES, MEDIA_SECONDS
+from rate_limiter import AdaptiveRateLimiter, mount_rate_limiter
+from session_cache import apply_csrf_header
+
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext
+except ImportError:  # Headless installs (cli.py, worker.py); only the GUI needs Tk
+    tk = ttk = messagebox = scrolledtext = None
 
 class RedirectText:
-    def __init__(self, text_widget):
+    """stdout replacement that shows printed text in a Tk text widget.
+
+    Writes from any thread land in a bounded buffer; every interval the Tk
+    thread appends everything buffered in a single insert and trims the
+    widget to its last max_lines lines, so heavy logging can't stall the
+    main loop or grow memory without bound.
+    """
+
+    def __init__(self, text_widget, max_lines: int = 2000, interval_ms: int = 100):
         self.text_widget = text_widget
-        self.queue = queue.Queue()
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.buffer = deque(maxlen=max_lines * 2)  # Whole lines arrive as text plus a separate '\n' write
+        self.dropped = 0
+        self._lock = threading.Lock()
         self.update_me()
 
     def write(self, string):
-        self.queue.put(string)
+        with self._lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(string)
 
     def flush(self):
         pass
 
     def update_me(self):
-        while True:
-            try:
-                while True:
-                    string = self.queue.get_nowait()
-                    self.text_widget.configure(state='normal')
-                    self.text_widget.insert('end', string)
-                    self.text_widget.see('end')
-                    self.text_widget.configure(state='disabled')
-            except queue.Empty:
-                break
-        self.text_widget.after(100, self.update_me)
+        with self._lock:
+            chunks, dropped = list(self.buffer), self.dropped
+            self.buffer.clear()
+            self.dropped = 0
+
+        if chunks:
+            text = ''.join(chunks)
+            if dropped:
+                text = f"... {dropped} earlier messages skipped ...\n" + text
+            self.text_widget.configure(state='normal')
+            self.text_widget.insert('end', text)
+            # Keep only the newest max_lines lines
+            excess = int(self.text_widget.index('end-1c').split('.')[0]) - self.max_lines
+            if excess > 0:
+                self.text_widget.delete('1.0', f'{excess + 1}.0')
+            self.text_widget.see('end')
+            self.text_widget.configure(state='disabled')
+        self.text_widget.after(self.interval_ms, self.update_me)
+
+class SharedRateController(instaloader.RateController):
+    """Instaloader rate controller that paces queries with the shared AdaptiveRateLimiter"""
+
+    def __init__(self, context, limiter: AdaptiveRateLimiter):
+        super().__init__(context)
+        self.limiter = limiter
+
+    def wait_before_query(self, query_type: str) -> None:
+        self.limiter.acquire('api')
+
+    def handle_429(self, query_type: str) -> None:
+        self.limiter.on_throttled('api')
+        self.limiter.acquire('api')
 
 class InstagramDownloader:
     def __init__(self, download_dir: str = 'downloads'):
         self.download_dir = Path(download_dir)
-        self.quality = "high"
+        self.quality = "high"  # Variant policy: 'high', 'low', 'preview', a width or WIDTHxHEIGHT
         self.loader = None
         self.download_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = DownloadManifest(self.download_dir / 'manifest.db')
+        self.store = MediaStore(self.download_dir)
+        self.metadata_cache = MetadataCache(self.download_dir / 'metadata_cache.db')
         self.is_logged_in = False
         self.last_password = None  # Store password for session refresh
         self._username = None  # Store username for profile downloader
+        self.session = requests.Session()  # Keep-alive session for direct media downloads
+        self.rate_limiter = AdaptiveRateLimiter()  # Shared by instaloader, media downloads and profile downloads
+        mount_rate_limiter(self.session, self.rate_limiter)
+        self._profile_downloader = None  # Logged-in InstagramProfileDownloader, reused across profiles
+        self._profile_downloader_lock = threading.Lock()
+        self._post_locks = weakref.WeakValueDictionary()  # Shortcode -> lock on its staging directory
+        self._post_locks_lock = threading.Lock()
         
     def login(self, username: str, password: str) -> bool:
-        """Login to Instagram account"""
+        """Login to Instagram account.
+
+        The profile downloader logs in (or restores a saved session) first and
+        instaloader is handed the same cookie jar, so a run authenticates once.
+        """
         if not self.loader:
             self.initialize_loader()
             
         try:
             print("Attempting to log in to Instagram...")
-            self.loader.login(username, password)
+            profile_downloader = InstagramProfileDownloader(str(self.download_dir), rate_limiter=self.rate_limiter,
+                                                            metadata_cache=self.metadata_cache, manifest=self.manifest)
+            if not profile_downloader.login(username, password):
+                # Fall back to instaloader's own login flow and keep its cookies for next time
+                self.loader.login(username, password)
+                LOGINS.inc(result='ok')
+                profile_downloader.session.cookies.update(self.loader.context._session.cookies)
+                apply_csrf_header(profile_downloader.session)
+                profile_downloader.session_cache.save(profile_downloader.session, username)
+
+            self.loader.load_session(username, profile_downloader.session.cookies.get_dict())
+            # Share the jar itself so cookie refreshes from either client reach both
+            self.loader.context._session.cookies = profile_downloader.session.cookies
+            self._profile_downloader = profile_downloader
             self.is_logged_in = True
             self.last_password = password  # Store password for session refresh
             self._username = username  # Store username for profile downloader
@@ -65,9 +142,11 @@ class InstagramDownloader:
             return True
         except Exception as e:
             print(f"Failed to login: {str(e)}")
+            LOGINS.inc(result='failed')
             self.is_logged_in = False
             self.last_password = None
             self._username = None
+            self._profile_downloader = None
             return False
     def initialize_loader(self):
         """Initialize the Instaloader instance with optimized settings"""
@@ -83,21 +162,17 @@ class InstagramDownloader:
             post_metadata_txt_pattern="",
             max_connection_attempts=3,
             request_timeout=60.0,
-            quiet=False
+            quiet=False,
+            rate_controller=lambda context: SharedRateController(context, self.rate_limiter)
         )
         # Configure session to handle rate limits
         self.loader.context._session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
         self.loader.context.max_connection_attempts = 3
         self.loader.context.request_timeout = 60.0
-        self.loader.context.query_delay = lambda: uniform(5.0, 15.0)  # Random delay between requests
 
-    def wait_with_backoff(self, attempt: int):
-        """Implement exponential backoff waiting"""
-        wait_time = min(300, 30 * (2 ** attempt))  # Max 5 minutes
-        jitter = uniform(-5, 5)
-        actual_wait = wait_time + jitter
-        print(f"\nRate limit hit. Waiting {actual_wait:.1f} seconds before retrying...")
-        time.sleep(actual_wait)
+    def wait_with_backoff(self, attempt: int, endpoint: str = 'api'):
+        """Wait before a retry, using Retry-After when the server sent one"""
+        self.rate_limiter.backoff(endpoint, attempt)
 
     def download_post(self, url: str) -> List[Path]:
         """Download a single post."""
@@ -106,13 +181,20 @@ class InstagramDownloader:
             if not shortcode:
                 raise ValueError("Invalid Instagram URL")
 
+            # Skip posts the manifest already has, before spending a metadata request on them
+            recorded = self.manifest.get_finished_post(shortcode)
+            if recorded:
+                print(f"\nPost {shortcode} already downloaded")
+                MEDIA.inc(len(recorded), source='post', result='skipped')
+                return [Path(row['path']) for row in recorded]
+
             print(f"\nFetching post with shortcode: {shortcode}")
             attempt = 0
             max_attempts = 3
             
             while attempt < max_attempts:
                 try:
-                    post = instaloader.Post.from_shortcode(self.loader.context, shortcode)
+                    post = self._get_post(shortcode)
                     break
                 except Exception as e:
                     attempt += 1
@@ -121,12 +203,61 @@ class InstagramDownloader:
                     print(f"Error fetching post: {e}")
                     self.wait_with_backoff(attempt)
             
-            return self._download_post(post)
+            files = self._download_post(post)
+            if files:
+                self.manifest.record_post(shortcode, len(files))
+            return files
             
         except Exception as e:
             print(f"Error downloading post: {str(e)}")
             raise
 
+    def _get_post(self, shortcode: str) -> instaloader.Post:
+        """Post metadata for a shortcode, taken from the metadata cache after a recent lookup"""
+        node = self.metadata_cache.get_or_fetch(
+            'post_node', shortcode,
+            lambda: instaloader.Post.from_shortcode(self.loader.context, shortcode)._full_metadata, POST_TTL)
+        post = instaloader.Post(self.loader.context, node)
+        post._full_metadata_dict = node  # Already complete, so instaloader won't query it again
+        return post
+
+    def download_posts(self, urls: List[str], max_workers: int = 8,
+                       progress_callback: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Download many post/reel URLs at once and return one result per URL.
+
+        Each distinct shortcode is resolved and downloaded once, concurrently,
+        through the profile downloader's media info requests. Posts it cannot
+        resolve are retried through instaloader.
+        """
+        shortcodes = [(url, self._extract_shortcode_from_url(url)) for url in urls]
+        profile_downloader = self.get_profile_downloader()
+        results = profile_downloader.download_posts([s for _, s in shortcodes if s], max_workers, progress_callback)
+
+        def retry(result: Dict):
+            shortcode = result['shortcode']
+            print(f"Retrying {shortcode} through instaloader: {result['error']}")
+            try:
+                files = self.download_post(f'https://www.instagram.com/p/{shortcode}/')
+                results[shortcode] = {'shortcode': shortcode, 'status': 'ok', 'files': [str(f) for f in files],
+                                      'elapsed_s': result['elapsed_s']}
+            except Exception as e:
+                result['error'] = str(e)
+
+        failed = [result for result in results.values() if result['status'] == 'failed']
+        if failed:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                list(executor.map(retry, failed))
+
+        seen = set()
+        per_url = []
+        for url, shortcode in shortcodes:
+            if not shortcode:
+                per_url.append({'url': url, 'status': 'failed', 'error': "Invalid Instagram URL"})
+                continue
+            per_url.append(dict(results[shortcode], url=url, duplicate=shortcode in seen))
+            seen.add(shortcode)
+        return per_url
+
     def _get_profile_post_urls(self, profile_url: str) -> List[str]:
         """Get all post URLs from a profile using a web request."""
         username = self._extract_username_from_url(profile_url)
@@ -159,7 +290,22 @@ class InstagramDownloader:
 
         return urls
 
-    def download_profile(self, profile_url: str) -> List[Path]:
+    def get_profile_downloader(self) -> InstagramProfileDownloader:
+        """Return the profile downloader, logging it in on first use and reusing it afterwards"""
+        with self._profile_downloader_lock:
+            if self._profile_downloader is None:
+                profile_downloader = InstagramProfileDownloader(str(self.download_dir), rate_limiter=self.rate_limiter,
+                                                                metadata_cache=self.metadata_cache, manifest=self.manifest)
+
+                # Login using stored credentials
+                if not profile_downloader.login(self._username, self.last_password):
+                    raise Exception("Failed to authenticate profile downloader")
+                self._profile_downloader = profile_downloader
+            self._profile_downloader.variant_policy = parse_policy(self.quality)
+            return self._profile_downloader
+
+    def download_profile(self, profile_url: str, limit: Optional[int] = None, max_workers: int = 3,
+                         sync: bool = False, progress_callback: Optional[Callable[[Dict], None]] = None) -> List[Path]:
         """Download all posts from a profile."""
         try:
             username = self._extract_username_from_url(profile_url)
@@ -167,16 +313,11 @@ class InstagramDownloader:
                 raise ValueError("Invalid profile URL")
 
             print(f"\nFetching profile: {username}")
-            
-            # Create profile downloader instance only when needed
-            profile_downloader = InstagramProfileDownloader(str(self.download_dir))
-            
-            # Login using stored credentials
-            if not profile_downloader.login(self._username, self.last_password):
-                raise Exception("Failed to authenticate profile downloader")
+            profile_downloader = self.get_profile_downloader()
             
             print("Using improved profile downloader...")
-            profile_downloader.download_profile(username)
+            profile_downloader.download_profile(username, limit=limit, max_workers=max_workers, sync=sync,
+                                                progress_callback=progress_callback)
             
             # Return the path to the downloads directory for this user
             return [self.download_dir / username]
@@ -290,65 +431,106 @@ class InstagramDownloader:
             raise
 
     def _download_post(self, post) -> List[Path]:
-        """Download a single post."""
-        temp_dir = self.download_dir / "temp"
-        if temp_dir.exists():
-            for f in temp_dir.glob('*'):
-                f.unlink()
-            temp_dir.rmdir()
-        temp_dir.mkdir(exist_ok=True)
+        """Download a single post.
 
-        try:
-            if post.is_video:
-                if self.quality == "high" and hasattr(post, 'video_url'):
-                    url = post.video_url
+        Files are staged in .staging/<shortcode> and moved to their final,
+        per-post names with os.replace, so any number of posts can download
+        at the same time. The staging directory outlives a failed call, so
+        the next attempt at the post resumes its .part file.
+        """
+        policy = parse_policy(self.quality)
+        temp_dir = self.download_dir / '.staging' / post.shortcode
+
+        with self._post_lock(post.shortcode):
+            temp_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                images, videos = self._post_variants(post, policy)
+                if post.is_video:
+                    variant = select_variant(videos, policy, True, getattr(post, 'video_duration', None))
                     ext = '.mp4'
                 else:
+                    variant = select_variant(images, policy)
+                    ext = '.jpg'
+                if not variant:
                     self.loader.download_post(post, target=str(temp_dir))
-                    return self._process_downloaded_files(temp_dir, post.shortcode)
-            else:
-                url = post.url if self.quality == "high" else getattr(post, 'thumbnail_url', post.url)
-                ext = '.jpg'
+                    files = self._process_downloaded_files(temp_dir, post)
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                    return files
+                url = variant['url']
 
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            target_file = temp_dir / f"instagram_{post.shortcode}_{timestamp}{ext}"
-            
-            attempt = 0
-            max_attempts = 3
-            while attempt < max_attempts:
+                target_file = temp_dir / f"media{ext}"
+                start = time.perf_counter()
+                print(f"Downloading {ext[1:]} file...")
+                result = download_to_file(self.session, url, target_file)  # Retries and resumes by itself
+
+                final_path = self.download_dir / self._post_filename(post, 0, ext)
+                os.replace(target_file, final_path)
+                self.store.adopt(final_path, result.sha256)
+                self.manifest.record(post.shortcode, 0, final_path, size=result.size, sha256=result.sha256,
+                                     url=url, media_id=str(post.mediaid))
+                self._count_download(result.size, time.perf_counter() - start)
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return [final_path]
+
+            except Exception as e:
+                print(f"Direct download failed: {str(e)}")
                 try:
-                    print(f"Downloading {ext[1:]} file...")
-                    with requests.get(url, stream=True) as response:
-                        response.raise_for_status()
-                        with open(target_file, 'wb') as f:
-                            for chunk in response.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                    break
-                except Exception as e:
-                    attempt += 1
-                    if attempt >= max_attempts:
-                        raise
-                    print(f"Download attempt {attempt} failed: {e}")
-                    self.wait_with_backoff(attempt)
+                    print("Trying fallback download method...")
+                    self.loader.download_post(post, target=str(temp_dir))
+                    files = self._process_downloaded_files(temp_dir, post)
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                    return files
+                except Exception as e2:
+                    print(f"Fallback download failed: {str(e2)}")
+                    MEDIA.inc(source='post', result='failed')
+                    raise
 
-            final_path = self.download_dir / target_file.name
-            if final_path.exists():
-                final_path.unlink()
-            target_file.rename(final_path)
-            
-            temp_dir.rmdir()
-            return [final_path]
+    def _post_lock(self, shortcode: str) -> threading.Lock:
+        """Lock held while a post's staging directory is in use, shared by every caller for that post"""
+        with self._post_locks_lock:
+            lock = self._post_locks.get(shortcode)
+            if lock is None:
+                lock = self._post_locks[shortcode] = threading.Lock()
+            return lock
 
-        except Exception as e:
-            print(f"Direct download failed: {str(e)}")
+    @staticmethod
+    def _count_download(size: int, seconds: Optional[float] = None):
+        MEDIA.inc(source='post', result='downloaded')
+        MEDIA_BYTES.inc(size, source='post')
+        if seconds is not None:
+            MEDIA_SECONDS.observe(seconds, source='post')
+
+    @staticmethod
+    def _post_filename(post, index: int, ext: str) -> str:
+        """Final name of a post's file, unique per post and carousel position"""
+        date_str = post.date_local.strftime('%Y%m%d_%H%M%S')
+        suffix = f"_{index}" if index else ""
+        return f"instagram_{post.shortcode}_{date_str}{suffix}{ext}"
+
+    def _post_variants(self, post, policy=ORIGINAL) -> Tuple[List[Dict], List[Dict]]:
+        """Image and video renditions of a post as {'url', 'width', 'height'} candidates.
+
+        The original is on the post itself; the smaller renditions a policy
+        may pick are only listed by the mobile API, which costs a request.
+        """
+        struct = self._iphone_struct(post) if policy != ORIGINAL else {}
+        images = (struct.get('image_versions2') or {}).get('candidates') or [
+            {'url': r['src'], 'width': r.get('config_width'), 'height': r.get('config_height')}
+            for r in (getattr(post, '_node', None) or {}).get('display_resources', [])
+        ] or [{'url': post.url}]
+        videos = struct.get('video_versions') or []
+        if post.is_video and not videos and getattr(post, 'video_url', None):
+            videos = [{'url': post.video_url}]
+        return images, videos
+
+    def _iphone_struct(self, post) -> Dict:
+        """Mobile API view of a post, cached next to its node; needs a login"""
+        def fetch():
             try:
-                print("Trying fallback download method...")
-                self.loader.download_post(post, target=str(temp_dir))
-                return self._process_downloaded_files(temp_dir, post.shortcode)
-            except Exception as e2:
-                print(f"Fallback download failed: {str(e2)}")
-                raise
+                return post._iphone_struct
+            except Exception:
+                return None  # Not cached, so the next call asks again
+        return self.metadata_cache.get_or_fetch('post_struct', post.shortcode, fetch, POST_TTL) or {}
 
     def _extract_shortcode_from_url(self, url: str) -> Optional[str]:
         """Extract shortcode from post URL."""
@@ -370,18 +552,22 @@ class InstagramDownloader:
             return None if username in ['p', 'reel'] else username
         return None
 
-    def _process_downloaded_files(self, temp_dir: Path, shortcode: str) -> List[Path]:
-        """Process downloaded files and move them to final location."""
+    def _process_downloaded_files(self, temp_dir: Path, post) -> List[Path]:
+        """Move the files instaloader saved for post out of its staging directory."""
+        def natural_key(file: Path):
+            # Carousel file _10 sorts after _9
+            return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', file.name)]
+
         downloaded_files = []
-        for file in temp_dir.glob('*'):
+        for file in sorted(temp_dir.glob('*'), key=natural_key):
             if file.suffix.lower() in ('.jpg', '.mp4'):
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                new_name = f"instagram_{shortcode}_{timestamp}{file.suffix}"
-                final_path = self.download_dir / new_name
-                
-                if final_path.exists():
-                    final_path.unlink()
-                file.rename(final_path)
+                final_path = self.download_dir / self._post_filename(post, len(downloaded_files), file.suffix.lower())
+                os.replace(file, final_path)
+                size = final_path.stat().st_size
+                sha256 = hash_file(final_path).hexdigest()
+                self.store.adopt(final_path, sha256)
+                self.manifest.record(post.shortcode, len(downloaded_files), final_path, size=size, sha256=sha256)
+                self._count_download(size)
                 downloaded_files.append(final_path)
                 print(f"Saved: {final_path.name}")
         
@@ -438,6 +624,8 @@ class InstagramDownloaderGUI:
                        value="high").pack(side=tk.LEFT, padx=5)
         ttk.Radiobutton(quality_frame, text="Low", variable=self.quality_var,
                        value="low").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(quality_frame, text="Preview", variable=self.quality_var,
+                       value="preview").pack(side=tk.LEFT, padx=5)
         
         # Download Type Selection
         ttk.Label(self.main_frame, text="Download:").grid(row=2, column=0, sticky=tk.W, pady=5)
@@ -452,12 +640,16 @@ class InstagramDownloaderGUI:
         self.download_button.grid(row=3, column=0, columnspan=3, pady=10)
         
         # Progress Bar
-        self.progress_bar = ttk.Progressbar(self.main_frame, mode='indeterminate')
+        self.progress_bar = ttk.Progressbar(self.main_frame, mode='determinate')
         self.progress_bar.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        self.progress_var = tk.StringVar(value="")
+        ttk.Label(self.main_frame, textvariable=self.progress_var).grid(row=5, column=0, columnspan=3, sticky=tk.W)
+        self.progress_event = None  # Latest event from the download threads, drawn by render_progress
+        self.downloading = False
         
         # Log Text
         self.log_text = scrolledtext.ScrolledText(self.main_frame, height=15, width=60)
-        self.log_text.grid(row=5, column=0, columnspan=3, pady=5)
+        self.log_text.grid(row=6, column=0, columnspan=3, pady=5)
         self.log_text.configure(state='disabled')
         
         # Redirect stdout to the log text
@@ -506,19 +698,58 @@ class InstagramDownloaderGUI:
             
         self.downloader.quality = self.quality_var.get()
         self.download_button.state(['disabled'])
-        self.progress_bar.start(10)
+        self.progress_event = None
+        self.progress_var.set("Starting...")
+        if self.download_type.get() == "post" and len(url.split()) == 1:
+            # A single post has no item count to show
+            self.progress_bar.configure(mode='indeterminate')
+            self.progress_bar.start(10)
+        else:
+            self.progress_bar.configure(mode='determinate', value=0, maximum=1)
+        self.downloading = True
+        self.render_progress()
         
         thread = threading.Thread(target=self.download_content, args=(url,))
         thread.daemon = True
         thread.start()
+
+    def on_progress(self, event: Dict):
+        """Progress callback for the download threads; only stores the event"""
+        self.progress_event = event
+
+    def render_progress(self):
+        """Draw the latest progress event, a few times a second while a download runs"""
+        event = self.progress_event
+        if event and str(self.progress_bar.cget('mode')) == 'determinate':
+            done, total = event['completed'], max(event['found'], 1)
+            self.progress_bar.configure(maximum=total, value=done)
+            parts = [f"{done}/{event['found']}{'+' if event['enumerating'] else ''} items"]
+            if event['failed']:
+                parts.append(f"{event['failed']} failed")
+            if event['skipped']:
+                parts.append(f"{event['skipped']} already downloaded")
+            parts.append(f"{event['bytes'] / 1e6:.1f} MB")
+            if event['eta_s'] is not None:
+                minutes, seconds = divmod(int(event['eta_s']), 60)
+                parts.append(f"ETA {minutes}:{seconds:02d}")
+            self.progress_var.set(" · ".join(parts))
+        if self.downloading:
+            self.root.after(200, self.render_progress)
         
     def download_content(self, url: str):
         """Download content based on selected type."""
         try:
-            if self.download_type.get() == "post":
+            urls = url.split()
+            if self.download_type.get() == "post" and len(urls) > 1:
+                # Several post URLs pasted at once are fetched as one batch
+                results = self.downloader.download_posts(urls, progress_callback=self.on_progress)
+                failed = [r['url'] for r in results if r['status'] == 'failed']
+                if failed:
+                    raise Exception(f"{len(failed)} of {len(results)} posts failed: {', '.join(failed[:5])}")
+            elif self.download_type.get() == "post":
                 self.downloader.download_post(url)
             else:
-                self.downloader.download_profile(url)
+                self.downloader.download_profile(url, progress_callback=self.on_progress)
             
             self.root.after(0, self.download_complete, True)
             
@@ -528,7 +759,12 @@ class InstagramDownloaderGUI:
     def download_complete(self, success: bool, error_message: str = None):
         """Handle download completion."""
         self.download_button.state(['!disabled'])
-        self.progress_bar.stop()
+        self.downloading = False
+        if str(self.progress_bar.cget('mode')) == 'indeterminate':
+            self.progress_bar.stop()
+            self.progress_var.set("")
+        else:
+            self.render_progress()  # Final counts
         
         if success:
             messagebox.showinfo("Success", "Download completed successfully!")
@@ -536,6 +772,8 @@ class InstagramDownloaderGUI:
             messagebox.showerror("Error", f"Download failed: {error_message}")
 
 def main():
+    if tk is None:
+        sys.exit("The GUI needs tkinter; use cli.py or worker.py to download without it")
     root = tk.Tk()
     app = InstagramDownloaderGUI(root)
     root.mainloop()
@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str  # 'profile' or 'post'
+    target: str  # Username or shortcode
+    attempts: int
+
+
+class JobQueue:
+    """Download jobs shared by worker processes through one SQLite file.
+
+    A worker leases a job for lease_seconds and keeps it by sending
+    heartbeats. A job whose lease runs out (its worker died or hung) goes
+    back to whichever worker asks next; failed jobs are retried with an
+    exponential delay until they have used max_attempts, which is stored
+    with each job when it is enqueued. Times are wall
+    clock, so hosts sharing a queue need synchronised clocks.
+
+    SQLite locking is only reliable on a local disk, so workers on several
+    hosts need the file on storage that honours it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            target TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            result TEXT,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            UNIQUE (kind, target)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, available_at);
+    """
+
+    def __init__(self, path: Path, max_attempts: int = 5, retry_delay: float = 60.0):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        # Other processes hold the write lock briefly; wait for it instead of failing
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def enqueue(self, kind: str, target: str, priority: int = 0) -> bool:
+        """Add a job unless the same target is already queued or done; True if it was added"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO jobs (kind, target, priority, max_attempts, available_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, target, priority, self.max_attempts, now, now)
+            )
+            return cursor.rowcount == 1
+
+    def requeue(self, kind: str, target: str) -> bool:
+        """Queue a finished or failed job again, e.g. to resync a profile"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, error = NULL, updated_at = ? "
+                "WHERE kind = ? AND target = ? AND status IN ('done', 'failed')",
+                (now, now, kind, target)
+            )
+            return cursor.rowcount == 1
+
+    def lease(self, owner: str, lease_seconds: float = 300.0) -> Optional[Job]:
+        """Claim the next ready job for owner, taking over jobs whose lease has run out"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Abandoned jobs that have used all their attempts are given up on
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Lease expired on the last attempt', "
+                    "lease_owner = NULL, updated_at = ? "
+                    "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                    (now, now)
+                )
+                row = self._conn.execute(
+                    "SELECT id, kind, target, attempts FROM jobs "
+                    "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?) "
+                    "ORDER BY priority DESC, available_at, id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute('COMMIT')
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (owner, now + lease_seconds, now, row['id'])
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return Job(row['id'], row['kind'], row['target'], row['attempts'] + 1)
+
+    def heartbeat(self, job_id: int, owner: str, lease_seconds: float = 300.0) -> bool:
+        """Extend owner's lease on a job; False if the lease was lost to another worker"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, owner: str, result: Optional[Dict] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_owner = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (json.dumps(result) if result is not None else None, now, job_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, owner: str, error: str, result: Optional[Dict] = None) -> bool:
+        """Record a failed attempt, queueing the job again after a delay unless it is out of attempts"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET "
+                "status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "available_at = ? + ? * (1 << (attempts - 1)), "
+                "result = ?, error = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (now, self.retry_delay, json.dumps(result) if result is not None else None, error, now,
+                 job_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """Hand a job back untried, e.g. when the worker shuts down, without using up an attempt"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, available_at = ?, "
+                "lease_owner = NULL, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (now, now, job_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def failed(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, target, attempts, error FROM jobs WHERE status = 'failed' ORDER BY id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
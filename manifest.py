@@ -0,0 +1,153 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class DownloadManifest:
+    """SQLite record of finished downloads, stored in the download directory.
+
+    Rows are keyed by (shortcode, carousel_index) with a secondary index on
+    media_id, so skip checks are a single indexed lookup no matter how many
+    files the archive holds or where they have been moved to.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS downloads (
+            shortcode TEXT NOT NULL,
+            carousel_index INTEGER NOT NULL DEFAULT 0,
+            media_id TEXT,
+            username TEXT,
+            url TEXT,
+            path TEXT NOT NULL,
+            size INTEGER,
+            sha256 TEXT,
+            completed_at REAL NOT NULL,
+            PRIMARY KEY (shortcode, carousel_index)
+        );
+        CREATE INDEX IF NOT EXISTS downloads_media_id ON downloads (media_id);
+        CREATE TABLE IF NOT EXISTS posts (
+            shortcode TEXT PRIMARY KEY,
+            files INTEGER NOT NULL,
+            completed_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sync_marks (
+            username TEXT PRIMARY KEY,
+            user_id TEXT,
+            taken_at INTEGER NOT NULL,
+            media_id TEXT,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS feed_cursors (
+            username TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            max_id TEXT NOT NULL,
+            items INTEGER NOT NULL,
+            failed INTEGER NOT NULL DEFAULT 0,
+            taken_at INTEGER,
+            media_id TEXT,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Shared by all download worker threads; access is serialised with _lock
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def get(self, shortcode: str, carousel_index: int = 0) -> Optional[Dict]:
+        """Return the manifest row for one media file, or None if it was never completed"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM downloads WHERE shortcode = ? AND carousel_index = ?',
+                (shortcode, carousel_index)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_by_media_id(self, media_id: str) -> Optional[Dict]:
+        """Return the manifest row for a media ID, or None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM downloads WHERE media_id = ?', (media_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_finished_post(self, shortcode: str) -> List[Dict]:
+        """Return the manifest rows of a post recorded with record_post, or [] if any of its files may be missing"""
+        with self._lock:
+            post = self._conn.execute('SELECT files FROM posts WHERE shortcode = ?', (shortcode,)).fetchone()
+            if post is None:
+                return []
+            rows = self._conn.execute(
+                'SELECT * FROM downloads WHERE shortcode = ? ORDER BY carousel_index', (shortcode,)
+            ).fetchall()
+        return [dict(row) for row in rows] if len(rows) >= post['files'] else []
+
+    def record_post(self, shortcode: str, files: int):
+        """Mark every file of a post as downloaded, after each was recorded with record"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO posts (shortcode, files, completed_at) VALUES (?, ?, ?)',
+                (shortcode, files, time.time())
+            )
+
+    def record(self, shortcode: str, carousel_index: int, path: Path, size: Optional[int] = None,
+               sha256: Optional[str] = None, url: Optional[str] = None, media_id: Optional[str] = None,
+               username: Optional[str] = None):
+        """Mark a media file as completely downloaded"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO downloads '
+                '(shortcode, carousel_index, media_id, username, url, path, size, sha256, completed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (shortcode, carousel_index, media_id, username, url, str(path), size, sha256, time.time())
+            )
+
+    def get_sync_mark(self, username: str) -> Optional[Dict]:
+        """Return the newest post seen by the last complete sync of a profile, or None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM sync_marks WHERE username = ?', (username,)).fetchone()
+        return dict(row) if row else None
+
+    def set_sync_mark(self, username: str, taken_at: int, media_id: Optional[str] = None,
+                      user_id: Optional[str] = None):
+        """Store the newest post of a profile after all of its media has been downloaded"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO sync_marks (username, user_id, taken_at, media_id, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (username, user_id, taken_at, media_id, time.time())
+            )
+
+    def get_feed_cursor(self, username: str) -> Optional[Dict]:
+        """Return where an interrupted crawl of a profile's feed can resume, or None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM feed_cursors WHERE username = ?', (username,)).fetchone()
+        return dict(row) if row else None
+
+    def set_feed_cursor(self, username: str, user_id: str, max_id: str, items: int, failed: int = 0,
+                        taken_at: Optional[int] = None, media_id: Optional[str] = None):
+        """Checkpoint a crawl: the page cursor to resume from, media items before it and failures so far.
+
+        taken_at and media_id are the newest post of the crawl, which becomes
+        the sync mark once the resumed crawl completes.
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO feed_cursors '
+                '(username, user_id, max_id, items, failed, taken_at, media_id, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (username, user_id, max_id, items, failed, taken_at, media_id, time.time())
+            )
+
+    def clear_feed_cursor(self, username: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM feed_cursors WHERE username = ?', (username,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,62 @@
+import os
+import shutil
+from pathlib import Path
+
+
+class MediaStore:
+    """Content-addressed media storage shared by every profile in a download directory.
+
+    Each distinct file is kept once under .media_store/<aa>/<sha256>.<ext>.
+    The files users see (profile folders, single-post downloads) are hard
+    links to those objects, or symlinks where hard links are not possible,
+    so reposts and overlapping profiles don't store the same bytes twice.
+    """
+
+    def __init__(self, download_dir: Path, link_mode: str = 'hardlink'):
+        if link_mode not in ('hardlink', 'symlink'):
+            raise ValueError(f"Unknown link mode: {link_mode}")
+        self.root = Path(download_dir) / '.media_store'
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.link_mode = link_mode
+
+    def object_path(self, sha256: str, ext: str) -> Path:
+        """Location of the stored object for a digest"""
+        return self.root / sha256[:2] / f"{sha256}.{ext.lstrip('.')}"
+
+    def adopt(self, filepath: Path, sha256: str) -> Path:
+        """Move a finished download into the store and leave a link to it at filepath"""
+        filepath = Path(filepath)
+        obj = self.object_path(sha256, filepath.suffix)
+        if obj.exists():
+            # Same bytes are already stored for another post or profile
+            filepath.unlink()
+        else:
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(filepath, obj)
+        self.link(obj, filepath)
+        return obj
+
+    def link(self, obj: Path, view: Path) -> bool:
+        """Expose a stored object at view; returns False if the object is missing"""
+        if not obj.exists():
+            return False
+        view.parent.mkdir(parents=True, exist_ok=True)
+        if view.exists() or view.is_symlink():
+            return True
+
+        if self.link_mode == 'hardlink':
+            try:
+                os.link(obj, view)
+                return True
+            except FileExistsError:
+                return True  # Another worker linked it first
+            except OSError:
+                pass  # Cross-device or unsupported filesystem, fall back to a symlink
+        try:
+            # Relative so the whole download directory can be moved
+            view.symlink_to(os.path.relpath(obj, view.parent))
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(obj, view)
+        return True
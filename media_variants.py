@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Rough sizes for estimating bytes from dimensions when the API gives none
+IMAGE_BYTES_PER_PIXEL = 0.2  # Instagram JPEGs are ~250 KB at 1080x1350
+VIDEO_BITS_PER_PIXEL = 2.0  # Bits per second per pixel, ~4 Mbit/s at 1080x1920
+
+
+@dataclass(frozen=True)
+class VariantPolicy:
+    """Which of the renditions Instagram offers for a media file to download.
+
+    The largest candidate within every limit is chosen; if none fits, the
+    smallest one is. Limits left as None don't constrain the choice, so the
+    default policy always takes the full-resolution original.
+
+    The manifest records one file per media item, so archives kept at
+    different policies should use separate download directories.
+    """
+    max_width: Optional[int] = None
+    max_height: Optional[int] = None
+    max_bytes: Optional[int] = None  # Estimated from dimensions and duration
+    max_bitrate: Optional[int] = None  # Bits per second, videos only
+
+
+ORIGINAL = VariantPolicy()
+
+PRESETS = {
+    'high': ORIGINAL,
+    'low': VariantPolicy(max_width=640, max_bitrate=1_500_000),
+    'preview': VariantPolicy(max_width=320, max_height=640, max_bitrate=600_000),
+}
+
+
+def parse_policy(value: str) -> VariantPolicy:
+    """Policy for a preset name ('high', 'low', 'preview'), a width ('720') or a box ('720x1280')"""
+    value = value.strip().lower()
+    if value in PRESETS:
+        return PRESETS[value]
+    try:
+        if 'x' in value:
+            width, height = value.split('x', 1)
+            return VariantPolicy(max_width=int(width), max_height=int(height))
+        return VariantPolicy(max_width=int(value))
+    except ValueError:
+        raise ValueError(f"Unknown quality {value!r}: use {', '.join(PRESETS)}, a width or WIDTHxHEIGHT") from None
+
+
+def estimated_bytes(candidate: Dict, is_video: bool, duration: Optional[float] = None) -> Optional[int]:
+    """Approximate download size of a candidate, None if it cannot be estimated"""
+    area = (candidate.get('width') or 0) * (candidate.get('height') or 0)
+    if not is_video:
+        return int(area * IMAGE_BYTES_PER_PIXEL) if area else None
+    bitrate = estimated_bitrate(candidate)
+    return int(bitrate * duration / 8) if bitrate and duration else None
+
+
+def estimated_bitrate(candidate: Dict) -> Optional[int]:
+    """Bits per second of a video candidate, from its bandwidth field or its dimensions"""
+    if candidate.get('bandwidth'):
+        return int(candidate['bandwidth'])
+    area = (candidate.get('width') or 0) * (candidate.get('height') or 0)
+    return int(area * VIDEO_BITS_PER_PIXEL) if area else None
+
+
+def _fits(candidate: Dict, policy: VariantPolicy, is_video: bool, duration: Optional[float]) -> bool:
+    width, height = candidate.get('width'), candidate.get('height')
+    if policy.max_width and width and width > policy.max_width:
+        return False
+    if policy.max_height and height and height > policy.max_height:
+        return False
+    if policy.max_bytes:
+        size = estimated_bytes(candidate, is_video, duration)
+        if size and size > policy.max_bytes:
+            return False
+    if policy.max_bitrate and is_video:
+        bitrate = estimated_bitrate(candidate)
+        if bitrate and bitrate > policy.max_bitrate:
+            return False
+    return True
+
+
+def select_variant(candidates: List[Dict], policy: VariantPolicy = ORIGINAL, is_video: bool = False,
+                   duration: Optional[float] = None) -> Optional[Dict]:
+    """Pick one of a media file's candidates ({'url', 'width', 'height', ...}) under policy"""
+    candidates = [c for c in candidates if c.get('url')]
+    if not candidates:
+        return None
+    if not any(c.get('width') and c.get('height') for c in candidates):
+        return candidates[0]  # Nothing to compare; the API lists the original first
+
+    def area(candidate: Dict) -> int:
+        return (candidate.get('width') or 0) * (candidate.get('height') or 0)
+
+    fitting = [c for c in candidates if _fits(c, policy, is_video, duration)]
+    if fitting:
+        # max() keeps the first of equal-sized candidates, i.e. the API's own preference
+        return max(fitting, key=area)
+    return min((c for c in candidates if area(c)), key=area)
@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# How long each kind of lookup stays fresh, in seconds
+USER_ID_TTL = 7 * 24 * 3600  # IDs never change, but a username can be given up and reused
+PROFILE_TTL = 3600
+POST_TTL = 6 * 3600  # Post metadata carries signed CDN URLs that expire after a few days
+
+
+class MetadataCache:
+    """Two-tier cache for API lookups: an in-process LRU in front of SQLite.
+
+    Entries are JSON values keyed by (namespace, key), each with its own
+    expiry. The on-disk table is kept under max_bytes by dropping expired
+    entries first and then the least recently used ones, so re-runs, retries
+    and batch jobs share lookups without the file growing forever.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        );
+        CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+    """
+
+    def __init__(self, path: Path, memory_items: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory: OrderedDict = OrderedDict()  # (namespace, key) -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        self._disk_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return a cached value, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((namespace, key))
+            if entry and entry[0] > now:
+                self._memory.move_to_end((namespace, key))
+                return entry[1]
+
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+            if not row or row[1] <= now:
+                self._memory.pop((namespace, key), None)
+                return None
+            self._conn.execute(
+                'UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?', (now, namespace, key)
+            )
+            value = json.loads(row[0])
+            self._remember(namespace, key, row[1], value)
+            return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        """Store a JSON-serialisable value for ttl seconds"""
+        now = time.time()
+        data = json.dumps(value, separators=(',', ':'))
+        with self._lock:
+            old = self._conn.execute(
+                'SELECT size FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (namespace, key, value, size, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (namespace, key, data, len(data), now + ttl, now)
+            )
+            self._disk_bytes += len(data) - (old[0] if old else 0)
+            self._remember(namespace, key, now + ttl, value)
+            if self._disk_bytes > self.max_bytes:
+                self._evict(now)
+
+    def get_or_fetch(self, namespace: str, key: str, fetch: Callable[[], Any], ttl: float) -> Any:
+        """Return the cached value, calling fetch() and caching its result on a miss.
+
+        None results are not cached, so failed lookups are retried next time.
+        """
+        value = self.get(namespace, key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.set(namespace, key, value, ttl)
+        return value
+
+    def invalidate(self, namespace: str, key: str):
+        with self._lock:
+            self._memory.pop((namespace, key), None)
+            row = self._conn.execute(
+                'SELECT size FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+            if row:
+                self._conn.execute('DELETE FROM entries WHERE namespace = ? AND key = ?', (namespace, key))
+                self._disk_bytes -= row[0]
+
+    def _remember(self, namespace: str, key: str, expires_at: float, value: Any):
+        self._memory[(namespace, key)] = (expires_at, value)
+        self._memory.move_to_end((namespace, key))
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float):
+        """Shrink the table to 90% of max_bytes: expired entries first, then least recently used"""
+        self._conn.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+        self._disk_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        target = self.max_bytes * 0.9
+        if self._disk_bytes <= target:
+            return
+
+        victims = []
+        for namespace, key, size in self._conn.execute(
+            'SELECT namespace, key, size FROM entries ORDER BY accessed_at'
+        ):
+            victims.append((namespace, key))
+            self._disk_bytes -= size
+            if self._disk_bytes <= target:
+                break
+        self._conn.executemany('DELETE FROM entries WHERE namespace = ? AND key = ?', victims)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
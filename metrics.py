@@ -0,0 +1,217 @@
+"""Process-wide counters and histograms for the downloaders.
+
+The metrics below are updated by the download code and can be read as
+Prometheus text (serve() or REGISTRY.render_prometheus()) or as a JSON
+snapshot (REGISTRY.snapshot()) for long-running archive jobs.
+"""
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Metric:
+    """Named metric holding one value per combination of label values"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    """Monotonic value per label combination; names end in _total"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        """(suffix, labels, value) tuples in exposition order"""
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield '', dict(zip(self.labelnames, key)), value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {','.join(key): value for key, value in sorted(self._values.items())}
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets, per label combination"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield '_bucket', dict(labels, le='+Inf' if bound == math.inf else repr(bound)), cumulative
+            yield '_sum', labels, total
+            yield '_count', labels, cumulative
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                ','.join(key): {'count': sum(counts), 'sum': round(total, 6),
+                                'buckets': dict(zip(map(str, self.buckets + (math.inf,)), counts))}
+                for key, (counts, total) in sorted(self._values.items())
+            }
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{metric.name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{metric.name}{suffix} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict:
+        """All metrics as a JSON-serialisable dict, keyed by name and then by comma-joined label values"""
+        return {'timestamp': time.time(),
+                'metrics': {name: metric.snapshot() for name, metric in self.metrics.items()}}
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def serve(port: int, host: str = '127.0.0.1', registry: Optional[Registry] = None) -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json from a background thread"""
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] == '/metrics':
+                body, content_type = registry.render_prometheus().encode(), 'text/plain; version=0.0.4'
+            elif self.path.split('?')[0] == '/metrics.json':
+                body, content_type = json.dumps(registry.snapshot()).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'instagram_http_requests_total', "HTTP requests sent, by endpoint class and status code", ['endpoint', 'status'])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'instagram_http_request_seconds', "Time until response headers arrived", ['endpoint'])
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.counter(
+    'instagram_rate_limit_wait_seconds_total', "Time requests spent waiting for the rate limiter", ['endpoint'])
+THROTTLED = REGISTRY.counter(
+    'instagram_throttled_total', "429/5xx responses and connection failures that slowed an endpoint", ['endpoint'])
+BANDWIDTH_WAIT_SECONDS = REGISTRY.counter(
+    'instagram_bandwidth_wait_seconds_total', "Time downloads slept to stay under the bandwidth cap")
+BACKOFF_SECONDS = REGISTRY.counter(
+    'instagram_backoff_seconds_total', "Time slept in retry backoff", ['endpoint'])
+FEED_PAGES = REGISTRY.counter(
+    'instagram_feed_pages_total', "Profile feed pages fetched, by outcome", ['result'])
+FEED_PAGE_SECONDS = REGISTRY.histogram(
+    'instagram_feed_page_seconds', "Time to fetch and parse one feed page")
+MEDIA = REGISTRY.counter(
+    'instagram_media_total',
+    "Media files handled, by source (media_item: InstagramProfileDownloader, post: _download_post) and result",
+    ['source', 'result'])
+MEDIA_BYTES = REGISTRY.counter(
+    'instagram_media_bytes_total', "Bytes of media files completed", ['source'])
+MEDIA_SECONDS = REGISTRY.histogram(
+    'instagram_media_download_seconds', "Time to download one media file", ['source'])
+LOGINS = REGISTRY.counter(
+    'instagram_logins_total', "Login attempts, by result (restored, ok, failed)", ['result'])
+ACCOUNT_ROTATIONS = REGISTRY.counter(
+    'instagram_account_rotations_total', "Pooled accounts taken out of rotation, by reason (throttled, checkpoint)",
+    ['reason'])
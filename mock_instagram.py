@@ -0,0 +1,268 @@
+"""Local stand-in for the Instagram endpoints the downloaders use.
+
+Serves web_profile_info, the paginated feed/user API, media info and a CDN
+whose file size, latency, bandwidth and 429 rate are configurable, so
+downloads can be benchmarked on a machine without network access.
+
+    with MockInstagram(MockConfig(items=500)) as server:
+        downloader.api_base = server.base_url
+"""
+import json
+import random
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+@dataclass
+class MockConfig:
+    items: int = 1000  # Posts in the profile
+    page_size_max: int = 33  # Largest page the feed endpoint will return
+    video_every: int = 5  # Every n-th post is a video
+    carousel_every: int = 7  # Every n-th post is a carousel
+    carousel_size: int = 3
+    image_size: int = 150_000  # Bytes
+    video_size: int = 2_000_000
+    api_latency: float = 0.02  # Seconds before an API response
+    cdn_latency: float = 0.01  # Seconds before CDN response headers
+    bandwidth: float = 0.0  # Bytes/second per CDN connection, 0 for unlimited
+    rate_429: float = 0.0  # Fraction of requests answered with 429
+    retry_after: int = 1  # Retry-After seconds sent with a 429
+    user_id: str = '1000'
+    seed: int = 1
+
+
+_BLOCK = bytes(range(256)) * 256  # 64 KiB filler for CDN bodies
+
+
+def _shortcode(pk: int) -> str:
+    """Shortcode of a post as it appears in its URL (base64 of the numeric media ID)"""
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+    code = ''
+    while pk:
+        pk, digit = divmod(pk, 64)
+        code = alphabet[digit] + code
+    return code
+
+
+def _media(media_id: str, is_video: bool) -> Dict:
+    """Feed entry for one image or video, offering a full-size and a small variant"""
+    ext = 'mp4' if is_video else 'jpg'
+    url = f'{{base}}/cdn/{media_id}.{ext}'
+    media = {
+        'id': media_id,
+        'image_versions2': {'candidates': [
+            {'url': url.replace(f'.{ext}', '.jpg'), 'width': 1080, 'height': 1350},
+            {'url': url.replace(f'.{ext}', '_s.jpg'), 'width': 320, 'height': 400},
+        ]},
+    }
+    if is_video:
+        media['video_duration'] = 30.0
+        media['video_versions'] = [
+            {'url': url, 'width': 1080, 'height': 1920, 'type': 101},
+            {'url': url.replace('.mp4', '_s.mp4'), 'width': 480, 'height': 854, 'type': 102},
+        ]
+    return media
+
+
+def build_posts(config: MockConfig) -> List[Dict]:
+    """Feed items for the mock profile, newest first, with {base} placeholders in media URLs"""
+    now = int(time.time())
+    posts = []
+    for i in range(config.items):
+        pk = str(10 ** 12 + config.items - i)
+        post_id = f'{pk}_{config.user_id}'
+        is_video = i % config.video_every == 0
+        if config.carousel_every and i % config.carousel_every == 1:
+            post = {'id': post_id, 'carousel_media': [
+                _media(f'{pk}{n}_{config.user_id}', False) for n in range(config.carousel_size)
+            ]}
+        else:
+            post = _media(post_id, is_video)
+        post.update({
+            'code': _shortcode(int(pk)),
+            'taken_at': now - i * 3600,
+            'caption': {'text': f'Post number {i} ' + '#mock ' * 10},
+        })
+        posts.append(post)
+    return posts
+
+
+class MockInstagram:
+    """Threaded HTTP server implementing the mock endpoints"""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or MockConfig()
+        self.random = random.Random(self.config.seed)
+        self.stats = {'api_requests': 0, 'cdn_requests': 0, 'throttled': 0, 'bytes_sent': 0}
+        self._stats_lock = threading.Lock()
+        self.posts = build_posts(self.config)
+        self.media_ids = {media['id'] for post in self.posts for media in post.get('carousel_media', [post])}
+        self.posts_by_pk = {post['id'].split('_')[0]: post for post in self.posts}
+
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.base_url = f'http://{host}:{self.server.server_port}'
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _with_base(self, value):
+        """Substitute the server address into URLs of a post template"""
+        if isinstance(value, dict):
+            return {k: self._with_base(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._with_base(v) for v in value]
+        if isinstance(value, str) and value.startswith('{base}'):
+            return self.base_url + value[len('{base}'):]
+        return value
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # Small writes otherwise stall on delayed ACKs
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data, status: int = 200):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _throttled(self) -> bool:
+                if mock.config.rate_429 and mock.random.random() < mock.config.rate_429:
+                    mock.count('throttled')
+                    body = b'{"message":"Please wait a few minutes before you try again.","status":"fail"}'
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(mock.config.retry_after))
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return True
+                return False
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                query = dict(urllib.parse.parse_qsl(url.query))
+                if url.path.startswith('/cdn/'):
+                    self._cdn(url.path)
+                    return
+
+                mock.count('api_requests')
+                time.sleep(mock.config.api_latency)
+                if self._throttled():
+                    return
+                if url.path == '/api/v1/users/web_profile_info/':
+                    self._send_json({'data': {'user': {'id': mock.config.user_id, 'username': query.get('username')}}})
+                elif url.path == f'/api/v1/feed/user/{mock.config.user_id}/':
+                    self._feed(query)
+                elif url.path.startswith('/api/v1/media/') and url.path.endswith('/info/'):
+                    post = mock.posts_by_pk.get(url.path.split('/')[4])
+                    if post:
+                        item = dict(mock._with_base(post), user={'pk': mock.config.user_id, 'username': 'mock'})
+                        self._send_json({'items': [item], 'num_results': 1, 'status': 'ok'})
+                    else:
+                        self._send_json({'status': 'fail', 'message': 'Media not found or unavailable'}, 400)
+                elif url.path == '/api/v1/accounts/current_user/':
+                    self._send_json({'user': {'pk': mock.config.user_id}, 'status': 'ok'})
+                else:
+                    self._send_json({'status': 'fail', 'message': 'not found'}, 404)
+
+            def _feed(self, query):
+                count = min(int(query.get('count', 12)), mock.config.page_size_max)
+                start = int(query.get('max_id') or 0)
+                page = mock.posts[start:start + count]
+                more = start + count < len(mock.posts)
+                self._send_json({
+                    'items': [mock._with_base(post) for post in page],
+                    'num_results': len(page),
+                    'more_available': more,
+                    'next_max_id': str(start + count) if more else None,
+                    'status': 'ok',
+                })
+
+            def _cdn(self, path: str):
+                mock.count('cdn_requests')
+                time.sleep(mock.config.cdn_latency)
+                if self._throttled():
+                    return
+
+                name = path.rsplit('/', 1)[-1]
+                stem = name.split('.')[0]
+                media_id = stem.removesuffix('_s')
+                if media_id not in mock.media_ids:
+                    self._send_json({'status': 'fail'}, 404)
+                    return
+                size = mock.config.video_size if name.endswith('.mp4') else mock.config.image_size
+                if stem.endswith('_s'):
+                    size //= 4  # Low-resolution variant
+
+                start, end = 0, size
+                range_header = self.headers.get('Range')
+                ranged = bool(range_header and range_header.startswith('bytes='))
+                if ranged:
+                    first, last = range_header[6:].split('-')
+                    start = int(first)
+                    if last:
+                        end = min(size, int(last) + 1)
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(206 if ranged else 200)
+                self.send_header('Content-Type', 'video/mp4' if name.endswith('.mp4') else 'image/jpeg')
+                self.send_header('Content-Length', str(end - start))
+                self.send_header('Accept-Ranges', 'bytes')
+                if ranged:
+                    self.send_header('Content-Range', f'bytes {start}-{end - 1}/{size}')
+                self.end_headers()
+
+                # Unique prefix keeps every media file distinct for content hashing
+                prefix = media_id.encode().ljust(64, b'\0')
+                offset = start
+                while offset < end:
+                    if offset < len(prefix):
+                        chunk = prefix[offset:min(end, len(prefix))]
+                    else:
+                        # Same bytes at the same offset whether or not the request was ranged
+                        k = (offset - len(prefix)) % len(_BLOCK)
+                        chunk = _BLOCK[k:k + min(len(_BLOCK) - k, end - offset)]
+                    try:
+                        self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return  # Client stopped reading, e.g. a segmented download's first request
+                    offset += len(chunk)
+                    mock.count('bytes_sent', len(chunk))
+                    if mock.config.bandwidth:
+                        time.sleep(len(chunk) / mock.config.bandwidth)
+
+        return Handler
@@ -1,28 +1,219 @@
 import requests
 import json
 from pathlib import Path
-from typing import List, Dict, Optional, Generator
+from typing import Callable, List, Dict, Optional, Generator, Tuple
 from datetime import datetime
 import time
 from random import uniform
-import concurrent.futures
-from dataclasses import dataclass
+import threading
 import re
 import urllib.parse
+import asyncio
+import os
+import hashlib
+import concurrent.futures
+from http.cookies import SimpleCookie
+from download_scheduler import DownloadScheduler
+from download_utils import (BUFFER_SIZE, PREALLOCATE_MIN, download_to_file, hash_file, part_path, preallocate,
+                            segments_path)
+from manifest import DownloadManifest
+from media_store import MediaStore
+from media_variants import VariantPolicy, estimated_bytes, select_variant
+from metadata_cache import MetadataCache, POST_TTL, PROFILE_TTL, USER_ID_TTL
+from metrics import FEED_PAGE_SECONDS, FEED_PAGES, LOGINS, MEDIA, MEDIA_BYTES, MEDIA_SECONDS
+from rate_limiter import BANDWIDTH, AdaptiveRateLimiter, mount_rate_limiter
+from session_cache import SessionCache, apply_csrf_header
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # Optional, only needed by download_profile_async
+    aiohttp = None
+
+class PostInfo:
+    """Fields shared by every media file of one post, stored once per post"""
+    __slots__ = ('shortcode', 'taken_at', 'caption', 'post_id', 'pinned')
+
+    def __init__(self, shortcode: str, taken_at: int, caption: Optional[str] = None,
+                 post_id: Optional[str] = None, pinned: bool = False):
+        self.shortcode = shortcode
+        self.taken_at = taken_at  # Unix time the post was published
+        self.caption = caption
+        self.post_id = post_id
+        self.pinned = pinned  # Pinned posts are shown above newer posts in the feed
+
+    @property
+    def date(self) -> datetime:
+        return datetime.fromtimestamp(self.taken_at)
 
-@dataclass
 class MediaItem:
-    shortcode: str
-    url: str
-    is_video: bool
-    date: datetime
-    caption: Optional[str]
+    """One downloadable file. Post-level fields (shortcode, date, caption) are read from its PostInfo."""
+    __slots__ = ('post', 'url', 'is_video', 'media_id', 'index', 'size_hint')
+
+    def __init__(self, post: PostInfo, url: str, is_video: bool = False,
+                 media_id: Optional[str] = None, index: int = 0, size_hint: Optional[int] = None):
+        self.post = post
+        self.url = url
+        self.is_video = is_video
+        self.media_id = media_id
+        self.index = index  # Position within a carousel post
+        self.size_hint = size_hint  # Estimated bytes of a video from the feed's dimensions and duration
+
+    @property
+    def shortcode(self) -> str:
+        return self.post.shortcode
+
+    @property
+    def date(self) -> datetime:
+        return self.post.date
+
+    @property
+    def caption(self) -> Optional[str]:
+        return self.post.caption
+
+    def __eq__(self, other):
+        if not isinstance(other, MediaItem):
+            return NotImplemented
+        return (self.shortcode, self.index, self.url) == (other.shortcode, other.index, other.url)
+
+    def __hash__(self):
+        return hash((self.shortcode, self.index, self.url))
+
+    def __repr__(self):
+        kind = 'video' if self.is_video else 'image'
+        return f"MediaItem({self.shortcode!r}, index={self.index}, {kind}, media_id={self.media_id!r})"
+
+def _media_id(media: Dict) -> Optional[str]:
+    """The API's media ID, which is already a string, converted only when it isn't"""
+    media_id = media.get('id')
+    if not media_id:
+        return None
+    return media_id if isinstance(media_id, str) else str(media_id)
+
+def parse_feed_page(items: List[Dict], policy: Optional[VariantPolicy] = None) -> List[MediaItem]:
+    """Turn one page of feed/user items into MediaItems, one per image or video.
+
+    Carousel children share their post's PostInfo, so a caption is held once
+    per post no matter how many files the post has. Without a policy the
+    full-resolution original is taken; otherwise the rendition is chosen by
+    select_variant. Malformed items are reported and skipped.
+    """
+    media_items = []
+    append = media_items.append
+    for item in items:
+        try:
+            caption = item.get('caption')
+            post = PostInfo(
+                item['code'],
+                int(item['taken_at']),
+                caption.get('text') if caption else None,
+                _media_id(item),
+                bool(item.get('timeline_pinned_user_ids'))
+            )
+            carousel = item.get('carousel_media')
+            for index, media in enumerate(carousel or (item,)):
+                video_versions = media.get('video_versions')
+                candidates = video_versions or (media.get('image_versions2') or {}).get('candidates')
+                if not candidates:
+                    continue
+                is_video = bool(video_versions)
+                duration = media.get('video_duration')
+                if policy is None:
+                    variant = candidates[0]
+                else:
+                    variant = select_variant(candidates, policy, is_video, duration)
+                    if not variant:
+                        continue
+                # Images are all about the same size, so only videos carry a size estimate
+                append(MediaItem(post, variant['url'], is_video, _media_id(media), index,
+                                 estimated_bytes(variant, True, duration) if is_video else None))
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            print(f"Error processing item {item.get('code', '?') if isinstance(item, dict) else '?'}: {e}")
+    return media_items
+
+# Largest page the feed/user endpoint returns; larger counts are cut down to it
+FEED_PAGE_SIZE = 33
+
+SHORTCODE_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+
+
+def shortcode_to_media_id(shortcode: str) -> str:
+    """Decode a post URL's shortcode into the numeric media ID the mobile API takes"""
+    if len(shortcode) > 11:
+        shortcode = shortcode[:-28]  # Private links append a 28-character suffix
+    media_id = 0
+    for char in shortcode:
+        media_id = media_id * 64 + SHORTCODE_ALPHABET.index(char)
+    return str(media_id)
+
+class FeedCheckpoint:
+    """Saves the resume cursor of a download_profile crawl in the manifest.
+
+    The cursor saved is the one of the oldest feed page that still has media
+    queued or downloading, so a crash never skips media that was enumerated
+    but not downloaded; at worst one page is read again and its finished
+    items are skipped by the manifest.
+    """
+
+    def __init__(self, manifest: DownloadManifest, username: str, failed: int = 0, enabled: bool = True):
+        self.manifest = manifest
+        self.username = username
+        self.enabled = enabled  # False only tracks failures, e.g. for a limited run that must not move the cursor
+        self.failed = failed  # Carried over from the interrupted run so its failures still block the sync mark
+        self.pending: Dict[int, int] = {}  # Page number -> media items not yet finished
+        self.pages: Dict[int, Tuple[Optional[str], int]] = {}  # Page number -> (cursor, media items before it)
+        self.state: Dict = {}
+        self._saved_page = None
+        self._lock = threading.Lock()
+
+    def seen(self, state: Dict, queued: bool) -> int:
+        """Note a media item of the page described by feed_state; returns its page number"""
+        with self._lock:
+            self.state = state
+            page = state['page']
+            self.pages.setdefault(page, (state['page_cursor'], state['page_items']))
+            if queued:
+                self.pending[page] = self.pending.get(page, 0) + 1
+            self._save(False)
+        return page
+
+    def done(self, page: int, failed: bool):
+        with self._lock:
+            self.pending[page] -= 1
+            if not self.pending[page]:
+                del self.pending[page]
+            self.failed += failed
+            self._save(failed)
+
+    def _save(self, force: bool):
+        if not self.enabled:
+            return
+        page = min(self.pending) if self.pending else max(self.pages)
+        if page == self._saved_page and not force:
+            return
+        self._saved_page = page
+        for older in [p for p in self.pages if p < page]:
+            del self.pages[older]
+        cursor, items = self.pages[page]
+        if cursor is None:
+            return  # Still on the newest page; a restart begins there anyway
+        self.manifest.set_feed_cursor(self.username, self.state['user_id'], cursor, items, self.failed,
+                                      self.state.get('taken_at'), self.state.get('media_id'))
 
 class InstagramProfileDownloader:
-    def __init__(self, download_dir: str = 'downloads'):
+    def __init__(self, download_dir: str = 'downloads', rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 variant_policy: Optional[VariantPolicy] = None, metadata_cache: Optional[MetadataCache] = None,
+                 manifest: Optional[DownloadManifest] = None):
         self.download_dir = Path(download_dir)
         self.download_dir.mkdir(parents=True, exist_ok=True)
+        # Downloaders of one download_dir (e.g. a SessionPool's accounts) can share one manifest connection
+        self.manifest = manifest or DownloadManifest(self.download_dir / 'manifest.db')
+        # Profile and post lookups, shared with InstagramDownloader when it creates this downloader
+        self.metadata_cache = metadata_cache or MetadataCache(self.download_dir / 'metadata_cache.db')
+        self.store = MediaStore(self.download_dir)
+        self.api_base = 'https://www.instagram.com'  # Overridden to point at mock_instagram in benchmarks
         self.session = requests.Session()
+        self.session_cache = SessionCache(self.download_dir / '.sessions')
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
@@ -42,9 +233,23 @@ class InstagramProfileDownloader:
             'Cache-Control': 'no-cache',
         }
         self.session.headers.update(self.headers)
+        # All requests are paced by a limiter that can be shared with other downloaders
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        mount_rate_limiter(self.session, self.rate_limiter)
+        # Per-username result of the last get_profile_media run, used to advance sync marks
+        self.feed_state: Dict[str, Dict] = {}
+        self.variant_policy = variant_policy  # None downloads the full-resolution originals
 
     def login(self, username: str, password: str) -> bool:
-        """Login to Instagram"""
+        """Login to Instagram, reusing a saved session while it is still valid"""
+        restored = self.session_cache.restore(self.session, username)
+        if restored:
+            print("Reusing saved Instagram session")
+            LOGINS.inc(result='restored')
+            return True
+        if restored is False:
+            print("Saved Instagram session has expired, logging in again...")
+
         try:
             # First get the initial cookies and CSRF token
             login_url = 'https://www.instagram.com/accounts/login/'
@@ -109,18 +314,26 @@ class InstagramProfileDownloader:
             ])
 
             if is_authenticated:
+                apply_csrf_header(self.session)
+                self.session_cache.save(self.session, username)
                 print("Successfully logged in to Instagram")
+                LOGINS.inc(result='ok')
                 return True
             else:
                 print("Failed to login: Authentication failed")
+                LOGINS.inc(result='failed')
                 return False
 
         except Exception as e:
             print(f"Failed to login: {str(e)}")
+            LOGINS.inc(result='failed')
             return False
 
     def get_user_id(self, username: str) -> Optional[str]:
         """Get user ID from username"""
+        cached = self.metadata_cache.get('user_id', username.lower())
+        if cached:
+            return cached
         try:
             # First get the API response
             api_url = f'https://i.instagram.com/api/v1/users/web_profile_info/?username={username}'
@@ -138,7 +351,9 @@ class InstagramProfileDownloader:
             
             data = response.json()
             if data and 'data' in data and 'user' in data['data']:
-                return data['data']['user']['id']
+                user_id = data['data']['user']['id']
+                self.metadata_cache.set('user_id', username.lower(), user_id, USER_ID_TTL)
+                return user_id
             
             print(f"Could not find user ID in API response for {username}")
             return None
@@ -151,437 +366,669 @@ class InstagramProfileDownloader:
                 print(f"Response content: {response.text[:200]}...")  # Print first 200 chars
             return None
 
-    def get_profile_media(self, username: str, limit: Optional[int] = None) -> Generator[MediaItem, None, None]:
-        """Get all media from a profile using Instagram's API"""
+    def get_profile_info(self, username: str, headers: Optional[Dict] = None) -> Optional[Dict]:
+        """Return the web_profile_info user object for a username, cached for PROFILE_TTL"""
+        cached = self.metadata_cache.get('profile', username.lower())
+        if cached:
+            return cached
+
+        user_info_url = f'{self.api_base}/api/v1/users/web_profile_info/?username={username}'
+        headers = headers or self._api_headers(f'https://www.instagram.com/{username}/')
+        print(f"Fetching profile info for {username}...")
+        response = self.session.get(user_info_url, headers=headers)
+        if response.status_code == 404:
+            print(f"Profile {username} not found")
+            return None
+        response.raise_for_status()
+
         try:
-            # Set up headers for all requests
-            headers = self.session.headers.copy()
-            headers.update({
-                'X-IG-App-ID': '936619743392459',
-                'X-Requested-With': 'XMLHttpRequest',
-                'Accept': '*/*',
-                'X-ASBD-ID': '198387',
-                'X-IG-WWW-Claim': '0',
-                'X-CSRFToken': self.session.cookies.get('csrftoken', ''),
-                'Referer': f'https://www.instagram.com/{username}/',
-                'Sec-Fetch-Site': 'same-origin',
-                'Sec-Fetch-Mode': 'cors',
-                'Sec-Fetch-Dest': 'empty'
-            })
+            user_data = response.json()
+            user = user_data.get('data', {}).get('user')
+            if not user:
+                print(f"No data found for user {username}")
+                print(f"Response: {user_data}")
+                return None
+        except Exception as e:
+            print(f"Error parsing user data: {e}")
+            print(f"Response text: {response.text[:200]}...")
+            return None
 
-            # First, get the user ID using Instagram's user info endpoint
-            user_info_url = f'https://www.instagram.com/api/v1/users/web_profile_info/?username={username}'
-            
-            print(f"Fetching profile info for {username}...")
-            response = self.session.get(user_info_url, headers=headers)
-            if response.status_code == 404:
-                print(f"Profile {username} not found")
-                return
-            response.raise_for_status()
-            
-            try:
-                user_data = response.json()
-                if not user_data.get('data', {}).get('user'):
-                    print(f"No data found for user {username}")
-                    print(f"Response: {user_data}")
+        self.metadata_cache.set('profile', username.lower(), user, PROFILE_TTL)
+        self.metadata_cache.set('user_id', username.lower(), user['id'], USER_ID_TTL)
+        return user
+
+    def get_profile_media(self, username: str, limit: Optional[int] = None, since: Optional[Dict] = None,
+                          resume: Optional[Dict] = None) -> Generator[MediaItem, None, None]:
+        """Get all media from a profile using Instagram's API
+
+        since is a sync mark from the manifest; paging stops at the first
+        non-pinned post that is not newer than it. The newest post seen and
+        whether the whole feed (down to the mark) was read end up in
+        self.feed_state[username].
+
+        The request for the next page is sent as soon as a page arrives, so
+        it is in flight while the current page's items are consumed and paging
+        is paced by the rate limiter rather than by round trips. No page is
+        prefetched once the limit or the sync mark is within the current one.
+
+        resume is a feed cursor from the manifest: paging starts at its page
+        instead of the newest one. The page being read, the cursor it was
+        requested with and the media count before it are kept in feed_state
+        for download_profile to checkpoint.
+        """
+        state = self.feed_state[username] = {'complete': False}
+        prefetch = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed-prefetch')
+        try:
+            headers = self._api_headers(f'https://www.instagram.com/{username}/')
+
+            # First, get the user ID, from the cache or Instagram's user info endpoint
+            user_id = self.metadata_cache.get('user_id', username.lower())
+            if user_id:
+                print(f"Using cached user ID for {username}: {user_id}")
+            else:
+                user = self.get_profile_info(username, headers)
+                if not user:
                     return
-                user_id = user_data['data']['user']['id']
+                user_id = user['id']
                 print(f"Found user ID: {user_id}")
-            except Exception as e:
-                print(f"Error parsing user data: {e}")
-                print(f"Response text: {response.text[:200]}...")
-                return
+            state['user_id'] = user_id
 
             # Get user's media
+            url = f'{self.api_base}/api/v1/feed/user/{user_id}/'
             count = 0
-            has_next_page = True
-            max_id = None
-            
-            while has_next_page and (limit is None or count < limit):
-                time.sleep(uniform(1.0, 2.0))  # Add delay between requests
-                
+            cursor = None
+            if resume and resume['user_id'] == user_id:
+                cursor, count = resume['max_id'], resume['items']
+                if resume['taken_at'] is not None:
+                    state['taken_at'], state['media_id'] = resume['taken_at'], resume['media_id']
+                print(f"Resuming {username} after {count} media items")
+            state.update(page=0, page_cursor=cursor, page_items=count)
+            print(f"Fetching posts... (current count: {count})")
+            next_page = prefetch.submit(self._fetch_feed_page, url, cursor, headers)
+
+            while next_page and (limit is None or count < limit):
                 try:
-                    # Get user's posts using the feed API
-                    url = f'https://www.instagram.com/api/v1/feed/user/{user_id}/'
-                    params = {
-                        'count': 12  # Number of posts per request
-                    }
-                    if max_id:
-                        params['max_id'] = max_id
-                    
-                    print(f"Fetching posts... (current count: {count})")
-                    response = self.session.get(url, params=params, headers=headers)
-                    response.raise_for_status()
-                    data = response.json()
-                    
+                    data, fetch_seconds = next_page.result()
+                    next_page = None
+
                     if 'items' not in data:
                         print(f"No items found in response: {data}")
                         return
-                        
+
                     items = data['items']
                     if not items:
                         print("No more items available")
+                        state['complete'] = True
                         break
-                        
-                    for item in items:
+
+                    state.update(page=state['page'] + 1, page_cursor=cursor, page_items=count)
+                    page_start = time.perf_counter()
+                    page = parse_feed_page(items, self.variant_policy)
+                    FEED_PAGE_SECONDS.observe(time.perf_counter() - page_start + fetch_seconds)
+                    FEED_PAGES.inc(result='ok')
+
+                    # Request the next page now, unless this one already reaches the limit or the sync mark
+                    has_next_page = data.get('more_available', False)
+                    max_id = data.get('next_max_id')
+                    reaches_mark = since and any(
+                        not media.post.pinned and self._reached_sync_mark(media.post, since) for media in page
+                    )
+                    if has_next_page and max_id and (limit is None or count + len(page) < limit) and not reaches_mark:
+                        print(f"Fetching posts... (current count: {count + len(page)})")
+                        cursor = max_id
+                        next_page = prefetch.submit(self._fetch_feed_page, url, max_id, headers)
+
+                    last_post = None
+                    for media in page:
                         if limit and count >= limit:
+                            state['limited'] = True
                             return
-                            
-                        # Handle carousel posts (multiple images/videos)
-                        if item.get('carousel_media'):
-                            for carousel_item in item['carousel_media']:
-                                media_url = None
-                                is_video = bool(carousel_item.get('video_versions'))
-                                
-                                if is_video:
-                                    media_url = carousel_item['video_versions'][0]['url']
-                                else:
-                                    candidates = carousel_item.get('image_versions2', {}).get('candidates', [])
-                                    if candidates:
-                                        media_url = candidates[0]['url']
-                                
-                                if media_url:
-                                    yield MediaItem(
-                                        shortcode=item['code'],
-                                        url=media_url,
-                                        is_video=is_video,
-                                        date=datetime.fromtimestamp(item['taken_at']),
-                                        caption=item.get('caption', {}).get('text') if item.get('caption') else None
-                                    )
-                                    count += 1
-                        else:
-                            # Single image/video post
-                            media_url = None
-                            is_video = bool(item.get('video_versions'))
-                            
-                            if is_video:
-                                media_url = item['video_versions'][0]['url']
-                            else:
-                                candidates = item.get('image_versions2', {}).get('candidates', [])
-                                if candidates:
-                                    media_url = candidates[0]['url']
-                            
-                            if media_url:
-                                yield MediaItem(
-                                    shortcode=item['code'],
-                                    url=media_url,
-                                    is_video=is_video,
-                                    date=datetime.fromtimestamp(item['taken_at']),
-                                    caption=item.get('caption', {}).get('text') if item.get('caption') else None
-                                )
-                                count += 1
-                    
-                    # Update pagination info
-                    has_next_page = data.get('more_available', False)
-                    if has_next_page:
-                        max_id = data.get('next_max_id')
-                        if not max_id:
-                            print("No next_max_id found for pagination")
-                            break
-                    
+
+                        post = media.post
+                        # Pinned posts sit above newer ones, so they neither set nor trigger the sync mark
+                        if post is not last_post and not post.pinned:
+                            if 'taken_at' not in state:
+                                state['taken_at'] = post.taken_at
+                                state['media_id'] = post.post_id
+                            if since and self._reached_sync_mark(post, since):
+                                print(f"Reached last synced post {post.shortcode}, stopping")
+                                state['complete'] = True
+                                return
+                        last_post = post
+
+                        yield media
+                        count += 1
+
+                    if not has_next_page:
+                        state['complete'] = True
+                    elif not max_id:
+                        print("No next_max_id found for pagination")
+                    elif limit and count >= limit:
+                        state['limited'] = True
+
                 except Exception as e:
+                    FEED_PAGES.inc(result='failed')
                     print(f"Error fetching posts: {str(e)}")
-                    if 'response' in locals():
+                    response = getattr(e, 'response', None)
+                    if response is not None:
                         print(f"Response status: {response.status_code}")
                         print(f"Response text: {response.text[:200]}...")
                     return
 
-                if 'items' not in data:
-                    print("Invalid response format from Instagram API")
-                    print(f"Response: {data}")
-                    break
+        except Exception as e:
+            print(f"Error fetching profile media: {str(e)}")
+            return
+        finally:
+            # Drop a prefetched page nobody will read, e.g. when the consumer stops early
+            prefetch.shutdown(wait=False, cancel_futures=True)
 
-                items = data['items']
-                if not items:
-                    print("No items found in response")
-                    break
+    def _fetch_feed_page(self, url: str, max_id: Optional[str], headers: Dict[str, str]) -> Tuple[Dict, float]:
+        """Request one page of the feed/user endpoint, returning it and the seconds it took"""
+        params = {'count': FEED_PAGE_SIZE}
+        if max_id:
+            params['max_id'] = max_id
+        start = time.perf_counter()
+        response = self.session.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        return response.json(), time.perf_counter() - start
 
-                for item in items:
-                    if limit and count >= limit:
-                        return
+    def _api_headers(self, referer: str) -> Dict[str, str]:
+        """Headers for the web app's JSON API endpoints"""
+        headers = self.session.headers.copy()
+        headers.update({
+            'X-IG-App-ID': '936619743392459',
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': '*/*',
+            'X-ASBD-ID': '198387',
+            'X-IG-WWW-Claim': '0',
+            'X-CSRFToken': self.session.cookies.get('csrftoken', ''),
+            'Referer': referer,
+            'Sec-Fetch-Site': 'same-origin',
+            'Sec-Fetch-Mode': 'cors',
+            'Sec-Fetch-Dest': 'empty'
+        })
+        return headers
 
-                    try:
-                        # Handle carousel posts (multiple images/videos)
-                        if item.get('carousel_media'):
-                            for carousel_item in item['carousel_media']:
-                                # Get video URL
-                                video_url = None
-                                if carousel_item.get('video_versions'):
-                                    video_url = carousel_item['video_versions'][0]['url']
-                                
-                                # Get image URL
-                                image_url = None
-                                if carousel_item.get('image_versions2'):
-                                    candidates = carousel_item['image_versions2'].get('candidates', [])
-                                    if candidates:
-                                        image_url = candidates[0]['url']
-                                
-                                media_url = video_url or image_url
-                                if media_url:
-                                    yield MediaItem(
-                                        shortcode=item.get('code', ''),
-                                        url=media_url,
-                                        is_video=bool(video_url),
-                                        date=datetime.fromtimestamp(item.get('taken_at', 0)),
-                                        caption=item.get('caption', {}).get('text') if item.get('caption') else None
-                                    )
-                                    count += 1
-                        else:
-                            # Single image/video post
-                            # Get video URL
-                            video_url = None
-                            if item.get('video_versions'):
-                                video_url = item['video_versions'][0]['url']
-                            
-                            # Get image URL
-                            image_url = None
-                            if item.get('image_versions2'):
-                                candidates = item['image_versions2'].get('candidates', [])
-                                if candidates:
-                                    image_url = candidates[0]['url']
-                            
-                            media_url = video_url or image_url
-                            if media_url:
-                                yield MediaItem(
-                                    shortcode=item.get('code', ''),
-                                    url=media_url,
-                                    is_video=bool(video_url),
-                                    date=datetime.fromtimestamp(item.get('taken_at', 0)),
-                                    caption=item.get('caption', {}).get('text') if item.get('caption') else None
-                                )
-                                count += 1
-                    except Exception as e:
-                        print(f"Error processing item: {str(e)}")
-                        print(f"Item data: {item}")
-                        continue  # Continue with next item
-                    
-                    # Handle carousel posts (multiple images/videos)
-                    if node.get('__typename') == 'GraphSidecar':
-                        sidecar_children = node.get('edge_sidecar_to_children', {}).get('edges', [])
-                        for child in sidecar_children:
-                            child_node = child['node']
-                            yield MediaItem(
-                                shortcode=node['shortcode'],
-                                url=child_node['video_url'] if child_node.get('is_video') else child_node['display_url'],
-                                is_video=child_node.get('is_video', False),
-                                date=datetime.fromtimestamp(node['taken_at_timestamp']),
-                                caption=node.get('edge_media_to_caption', {}).get('edges', [{}])[0].get('node', {}).get('text')
-                            )
-                            count += 1
-                    else:
-                        # Single image/video post
-                        yield MediaItem(
-                            shortcode=node['shortcode'],
-                            url=node['video_url'] if node.get('is_video') else node['display_url'],
-                            is_video=node.get('is_video', False),
-                            date=datetime.fromtimestamp(node['taken_at_timestamp']),
-                            caption=node.get('edge_media_to_caption', {}).get('edges', [{}])[0].get('node', {}).get('text')
-                        )
-                        count += 1
+    def get_post_media(self, shortcode: str) -> Tuple[str, List[MediaItem]]:
+        """Resolve a single post into its owner's username and its media items.
 
-                # Check if there are more pages
-                has_next_page = bool(data.get('more_available'))
-                if has_next_page:
-                    end_cursor = data.get('next_max_id')
-                    if not end_cursor:
-                        print("No more pages available")
-                        break
-                else:
-                    print("No more items available")
-                    break
-            page_info = edge_owner_to_timeline_media.get('page_info', {})
-                
-            # Process all media items
-            while True:
-                for edge in edges:
-                    if limit and count >= limit:
-                        return
+        Uses the media info endpoint, which answers in the feed's format,
+        so one API request covers the post and every carousel child.
+        """
+        items = self.metadata_cache.get('post', shortcode)
+        if not items:
+            url = f'{self.api_base}/api/v1/media/{shortcode_to_media_id(shortcode)}/info/'
+            response = self.session.get(url, headers=self._api_headers(f'https://www.instagram.com/p/{shortcode}/'),
+                                        timeout=30)
+            response.raise_for_status()
+            items = response.json().get('items') or []
+            if not items:
+                raise ValueError(f"No media returned for post {shortcode}")
+            self.metadata_cache.set('post', shortcode, items, POST_TTL)
+        username = (items[0].get('user') or {}).get('username') or 'posts'
+        return username, parse_feed_page(items, self.variant_policy)
 
-                    node = edge['node']
-                    
-                    # Handle carousel posts (multiple images/videos)
-                    if node.get('__typename') == 'GraphSidecar':
-                        sidecar_children = node.get('edge_sidecar_to_children', {}).get('edges', [])
-                        for child in sidecar_children:
-                            child_node = child['node']
-                            yield MediaItem(
-                                shortcode=node['shortcode'],
-                                url=child_node['video_url'] if child_node['is_video'] else child_node['display_url'],
-                                is_video=child_node['is_video'],
-                                date=datetime.fromtimestamp(node['taken_at_timestamp']),
-                                caption=node.get('edge_media_to_caption', {}).get('edges', [{}])[0].get('node', {}).get('text')
-                            )
-                            count += 1
-                    else:
-                        # Single image/video post
-                        yield MediaItem(
-                            shortcode=node['shortcode'],
-                            url=node['video_url'] if node['is_video'] else node['display_url'],
-                            is_video=node['is_video'],
-                            date=datetime.fromtimestamp(node['taken_at_timestamp']),
-                            caption=node.get('edge_media_to_caption', {}).get('edges', [{}])[0].get('node', {}).get('text')
-                        )
-                        count += 1
+    @staticmethod
+    def _reached_sync_mark(post: PostInfo, since: Dict) -> bool:
+        """Check whether a post is at or before a stored sync mark"""
+        if since.get('media_id') and post.post_id == since['media_id']:
+            return True
+        return post.taken_at < since['taken_at']
 
-                # Check if we have more pages
-                has_next_page = page_info.get('has_next_page')
-                if not has_next_page or (limit and count >= limit):
-                    break
+    def _sync_since(self, username: str) -> Optional[Dict]:
+        """Load the profile's sync mark for an incremental run"""
+        since = self.manifest.get_sync_mark(username)
+        if since:
+            print(f"Syncing {username} since {datetime.fromtimestamp(since['taken_at'])}")
+        else:
+            print(f"No previous sync of {username}, reading the full feed")
+        return since
 
-                end_cursor = page_info.get('end_cursor')
-                if not end_cursor:
-                    break
+    def _update_sync_mark(self, username: str, failed: int):
+        """Advance the profile's sync mark if the feed was fully read and nothing failed"""
+        state = self.feed_state.pop(username, None)
+        if not state or not state['complete'] or failed or 'taken_at' not in state:
+            return
+        self.manifest.set_sync_mark(username, state['taken_at'], state.get('media_id'), state.get('user_id'))
 
-                # Get next page using GraphQL API
-                variables = {
-                    "id": user_id,
-                    "first": 50,
-                    "after": end_cursor
-                }
-
-                params = {
-                    'query_hash': '69cba40317214236af40e7efa697781d',
-                    'variables': json.dumps(variables)
-                }
-
-                response = self.session.get(
-                    'https://www.instagram.com/graphql/query/',
-                    params=params
-                )
-
-                if response.status_code != 200:
-                    print(f"Error fetching next page: HTTP {response.status_code}")
-                    break
+    def _media_filepath(self, media_item: MediaItem, username: str) -> Path:
+        """Build the target path for a media item, creating the user directory"""
+        user_dir = self.download_dir / username
+        user_dir.mkdir(exist_ok=True)
 
-                data = response.json()
-                user_media = data.get('data', {}).get('user', {}).get('edge_owner_to_timeline_media', {})
-                edges = user_media.get('edges', [])
-                page_info = user_media.get('page_info', {})
-                
-                for edge in edges:
-                    if limit and count >= limit:
-                        break
-                        
-                    node = edge['node']
-                    
-                    # Handle carousel posts (multiple images/videos)
-                    if node.get('__typename') == 'GraphSidecar':
-                        carousel_edges = node.get('edge_sidecar_to_children', {}).get('edges', [])
-                        for carousel_edge in carousel_edges:
-                            carousel_node = carousel_edge['node']
-                            yield MediaItem(
-                                shortcode=node['shortcode'],
-                                url=carousel_node['video_url'] if carousel_node['is_video'] else carousel_node['display_url'],
-                                is_video=carousel_node['is_video'],
-                                date=datetime.fromtimestamp(node['taken_at_timestamp']),
-                                caption=node.get('edge_media_to_caption', {}).get('edges', [{}])[0].get('node', {}).get('text')
-                            )
-                            count += 1
-                    else:
-                        # Single image/video post
-                        yield MediaItem(
-                            shortcode=node['shortcode'],
-                            url=node['video_url'] if node['is_video'] else node['display_url'],
-                            is_video=node['is_video'],
-                            date=datetime.fromtimestamp(node['taken_at_timestamp']),
-                            caption=node.get('edge_media_to_caption', {}).get('edges', [{}])[0].get('node', {}).get('text')
-                        )
-                        count += 1
-                
-                has_next_page = page_info['has_next_page']
-                end_cursor = page_info['end_cursor']
-                
-                # Add delay between requests
-                time.sleep(uniform(1.0, 2.0))
+        date_str = media_item.date.strftime("%Y%m%d_%H%M%S")
+        ext = "mp4" if media_item.is_video else "jpg"
+        # Carousel children after the first get their index so they don't collide with it
+        suffix = f"_{media_item.index}" if media_item.index else ""
+        return user_dir / f"instagram_{media_item.shortcode}_{date_str}{suffix}.{ext}"
 
-        except Exception as e:
-            print(f"Error fetching profile media: {str(e)}")
-            return
+    def _is_downloaded(self, media_item: MediaItem, username: str) -> bool:
+        """Check the manifest for a finished download of this media item.
+
+        Media already fetched for another profile (reposts, collabs) is linked
+        into this profile's folder from the media store instead of downloaded again.
+        """
+        row = self.manifest.get(media_item.shortcode, media_item.index)
+        if row is None and media_item.media_id:
+            row = self.manifest.get_by_media_id(media_item.media_id)
+        if row is None:
+            return False
+        if row['username'] == username or not row['sha256']:
+            return True
+        obj = self.store.object_path(row['sha256'], Path(row['path']).suffix)
+        return self.store.link(obj, self._media_filepath(media_item, username))
+
+    def _finish_download(self, media_item: MediaItem, username: str, filepath: Path, size: int, sha256: str):
+        """Move a finished download into the media store and record it in the manifest"""
+        self.store.adopt(filepath, sha256)
+        self.manifest.record(
+            media_item.shortcode, media_item.index, filepath, size=size, sha256=sha256,
+            url=media_item.url, media_id=media_item.media_id, username=username
+        )
+
+    @staticmethod
+    def _count_download(size: int, seconds: float):
+        MEDIA.inc(source='media_item', result='downloaded')
+        MEDIA_BYTES.inc(size, source='media_item')
+        MEDIA_SECONDS.observe(seconds, source='media_item')
 
     def download_media_item(self, media_item: MediaItem, username: str) -> bool:
         """Download a single media item"""
         try:
-            # Create user directory
-            user_dir = self.download_dir / username
-            user_dir.mkdir(exist_ok=True)
-            
-            # Generate filename
-            date_str = media_item.date.strftime("%Y%m%d_%H%M%S")
-            ext = "mp4" if media_item.is_video else "jpg"
-            filename = f"instagram_{media_item.shortcode}_{date_str}.{ext}"
-            filepath = user_dir / filename
+            if self._is_downloaded(media_item, username):
+                print(f"Already downloaded: {media_item.shortcode} #{media_item.index}")
+                MEDIA.inc(source='media_item', result='skipped')
+                return True
+
+            filepath = self._media_filepath(media_item, username)
+            filename = filepath.name
             
             # Don't redownload if file exists
             if filepath.exists():
                 print(f"File already exists: {filename}")
+                MEDIA.inc(source='media_item', result='skipped')
                 return True
                 
-            # Download the file
-            print(f"Downloading {filename}...")
-            response = self.session.get(media_item.url, stream=True)
-            
-            if response.ok:
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                print(f"Successfully downloaded: {filename}")
-                return True
+            # Download the file, resuming any .part file left by an interrupted run
+            if part_path(filepath).exists():
+                print(f"Resuming {filename}...")
             else:
-                print(f"Failed to download {filename}: HTTP {response.status_code}")
-                return False
-                
+                print(f"Downloading {filename}...")
+            start = time.perf_counter()
+            result = download_to_file(self.session, media_item.url, filepath)
+            self._finish_download(media_item, username, filepath, result.size, result.sha256)
+            self._count_download(result.size, time.perf_counter() - start)
+            print(f"Successfully downloaded: {filename}")
+            return True
+
+        except requests.HTTPError as e:
+            print(f"Failed to download {filepath.name}: HTTP {e.response.status_code}")
+            MEDIA.inc(source='media_item', result='failed')
+            return False
         except Exception as e:
             print(f"Error downloading {media_item.shortcode}: {str(e)}")
+            MEDIA.inc(source='media_item', result='failed')
             return False
 
-    def download_profile(self, username: str, limit: Optional[int] = None, max_workers: int = 3):
-        """Download all media from a profile"""
+    @staticmethod
+    def _progress_event(target: str, progress: Dict, started: float, enumerating: bool) -> Dict:
+        """Progress counts plus timing for a progress_callback; the ETA is known once enumeration ends"""
+        elapsed = time.monotonic() - started
+        done = progress['completed']
+        eta = (progress['found'] - done) * elapsed / done if done and not enumerating else None
+        return dict(progress, target=target, enumerating=enumerating, elapsed_s=round(elapsed, 1),
+                    eta_s=round(eta, 1) if eta is not None else None)
+
+    def download_profile(self, username: str, limit: Optional[int] = None, max_workers: int = 3,
+                         queue_size: int = 50, sync: bool = False,
+                         progress_callback: Optional[Callable[[Dict], None]] = None, resume: bool = True,
+                         schedule: str = 'fifo'):
+        """Download all media from a profile.
+
+        Enumeration and downloading run concurrently: this thread pages through the
+        feed and feeds a bounded queue that the workers drain, so the first file starts
+        downloading after the first page and memory stays flat on large profiles.
+
+        With sync=True, paging stops at the newest post of the last complete run
+        (the profile's sync mark), so a daily resync costs about one feed request.
+
+        progress_callback, if given, is called from the enumerating and worker
+        threads with a dict of counts, bytes, elapsed_s and eta_s.
+
+        The feed cursor is checkpointed in the manifest as pages are finished,
+        so with resume=True a crawl that died part way restarts at the oldest
+        page it had not finished instead of paging through the whole feed
+        again. A run with a limit fetches the newest posts: it neither uses
+        nor moves the checkpoint, which stays for the next full crawl.
+
+        schedule picks the order in which queued media is downloaded: 'fifo',
+        'sjf', 'lanes' or 'fair' (see DownloadScheduler).
+
+        Returns counts of media found, completed, skipped and failed, bytes
+        downloaded, and whether the feed was read to its end (complete).
+        """
         # Create user directory if it doesn't exist
         user_dir = self.download_dir / username
         user_dir.mkdir(exist_ok=True)
-        
-        # Collect all media items first
-        media_items = []
+
+        since = self._sync_since(username) if sync else None
+        # limit counts from the newest post, so only full crawls resume or checkpoint
+        cursor = self.manifest.get_feed_cursor(username) if resume and limit is None else None
+        checkpoint = FeedCheckpoint(self.manifest, username, cursor['failed'] if cursor else 0, limit is None)
+
+        work_queue = DownloadScheduler(schedule, queue_size, max_workers)
+        progress_lock = threading.Lock()
+        progress = {'found': 0, 'completed': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+        started = time.monotonic()
+        enumerating = True
+
+        def report():
+            if progress_callback:
+                with progress_lock:
+                    event = self._progress_event(username, progress, started, enumerating)
+                progress_callback(event)
+
+        def worker():
+            while True:
+                entry = work_queue.get()
+                if entry is None:
+                    return
+                item, page = entry
+                try:
+                    success = self.download_media_item(item, username)
+                    error = None
+                except Exception as e:
+                    success = False
+                    error = e
+                row = self.manifest.get(item.shortcode, item.index) if success else None
+                work_queue.done(item, row['size'] if row else None)
+                checkpoint.done(page, not success)
+
+                with progress_lock:
+                    progress['completed'] += 1
+                    if not success:
+                        progress['failed'] += 1
+                    if row and row['size']:
+                        progress['bytes'] += row['size']
+                    status = f"Progress: {progress['completed']}/{progress['found']}"
+                report()
+
+                if error is not None:
+                    print(f"{status} - Error downloading {item.shortcode}: {str(error)}")
+                elif success:
+                    print(f"{status} - Successfully downloaded {item.shortcode}")
+                else:
+                    print(f"{status} - Failed to download {item.shortcode}")
+
+        workers = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+        for thread in workers:
+            thread.start()
+
         try:
-            for item in self.get_profile_media(username, limit):
-                media_items.append(item)
+            for item in self.get_profile_media(username, limit, since=since, resume=cursor):
+                if self._is_downloaded(item, username):
+                    checkpoint.seen(self.feed_state[username], queued=False)
+                    with progress_lock:
+                        progress['skipped'] += 1
+                    MEDIA.inc(source='media_item', result='skipped')
+                    continue
+                with progress_lock:
+                    progress['found'] += 1
+                report()
                 print(f"Found media: {item.shortcode} ({'video' if item.is_video else 'image'})")
+                # Blocks while the queue is full so enumeration never runs far ahead of the workers
+                work_queue.put(item, checkpoint.seen(self.feed_state[username], queued=True))
         except Exception as e:
             print(f"Error fetching profile media: {str(e)}")
-            return
-        
-        if not media_items:
-            print(f"No media items found for user: {username}")
-            return
-            
-        print(f"\nFound {len(media_items)} media items. Starting download...")
-        
-        # Download media items with a thread pool
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(self.download_media_item, item, username): item 
-                for item in media_items
-            }
-            
-            completed = 0
-            total = len(futures)
-            
+        finally:
+            enumerating = False
+            report()
+            work_queue.close()
+            for thread in workers:
+                thread.join()
+
+        state = self.feed_state.get(username, {})
+        progress['complete'] = state.get('complete', False)
+        if progress['complete']:
+            self.manifest.clear_feed_cursor(username)
+        elif limit is None:
+            print(f"Enumeration of {username} stopped early; the next run resumes from its last checkpoint")
+        self._update_sync_mark(username, checkpoint.failed)
+
+        if progress['skipped']:
+            print(f"Skipped {progress['skipped']} media items already in the manifest")
+
+        if not progress['found']:
+            if not progress['skipped']:
+                print(f"No media items found for user: {username}")
+            return progress
+
+        print(f"\nFinished {progress['completed']}/{progress['found']} media items for {username}")
+        return progress
+
+    def download_post_media(self, shortcode: str) -> Dict:
+        """Download every file of one post into its owner's folder and describe the outcome"""
+        result = {'shortcode': shortcode, 'status': 'ok', 'files': []}
+        start = time.monotonic()
+        try:
+            # Rows alone don't say the post is whole: a profile run may have fetched only some carousel children
+            recorded = self.manifest.get_finished_post(shortcode)
+            if recorded:
+                result['files'] = [row['path'] for row in recorded]
+                result['cached'] = True
+            else:
+                username, media_items = self.get_post_media(shortcode)
+                if not media_items:
+                    raise ValueError(f"No downloadable media in post {shortcode}")
+                result['bytes'] = 0
+                for media_item in media_items:
+                    if not self.download_media_item(media_item, username):
+                        raise RuntimeError(f"Failed to download {shortcode} #{media_item.index}")
+                    result['files'].append(str(self._media_filepath(media_item, username)))
+                    row = self.manifest.get(shortcode, media_item.index)
+                    if row:
+                        result['bytes'] += row['size'] or 0
+                self.manifest.record_post(shortcode, len(media_items))
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        result['elapsed_s'] = round(time.monotonic() - start, 2)
+        return result
+
+    def download_posts(self, shortcodes: List[str], max_workers: int = 8,
+                       progress_callback: Optional[Callable[[Dict], None]] = None,
+                       download: Optional[Callable[[str], Dict]] = None) -> Dict[str, Dict]:
+        """Download many single posts concurrently, returning a result per distinct shortcode.
+
+        Posts recorded whole in the manifest cost no request. The rest are resolved
+        and fetched by max_workers threads; the shared rate limiter, not the
+        thread count, decides how fast the API and CDN are hit. progress_callback
+        gets the same events as in download_profile, counting posts. download
+        replaces download_post_media, e.g. to run each post on a pooled account.
+        """
+        download = download or self.download_post_media
+        shortcodes = list(dict.fromkeys(shortcodes))
+        results = {}
+        progress = {'found': len(shortcodes), 'completed': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+        started = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {executor.submit(download, shortcode): shortcode for shortcode in shortcodes}
             for future in concurrent.futures.as_completed(futures):
-                item = futures[future]
-                try:
-                    success = future.result()
-                    completed += 1
+                result = results[futures[future]] = future.result()
+                progress['completed'] += 1
+                progress['failed'] += result['status'] == 'failed'
+                progress['skipped'] += bool(result.get('cached'))
+                progress['bytes'] += result.get('bytes', 0)
+                print(f"Posts: {progress['completed']}/{len(shortcodes)} - {result['shortcode']} {result['status']}")
+                if progress_callback:
+                    progress_callback(self._progress_event('posts', progress, started, False))
+        return results
+
+    async def _download_media_item_async(self, http, media_item: MediaItem, username: str) -> bool:
+        """Download a single media item with an aiohttp session"""
+        try:
+            if self._is_downloaded(media_item, username):
+                print(f"Already downloaded: {media_item.shortcode} #{media_item.index}")
+                MEDIA.inc(source='media_item', result='skipped')
+                return True
+
+            filepath = self._media_filepath(media_item, username)
+            filename = filepath.name
+
+            # Don't redownload if file exists
+            if filepath.exists():
+                print(f"File already exists: {filename}")
+                MEDIA.inc(source='media_item', result='skipped')
+                return True
+
+            # Stage into a .part file and resume it with a Range request, as download_to_file does
+            part = part_path(filepath)
+            if segments_path(filepath).exists():
+                # Left by a segmented download, which only download_to_file can resume
+                part.unlink(missing_ok=True)
+                segments_path(filepath).unlink()
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {'Accept-Encoding': 'identity'}
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+                print(f"Resuming {filename}...")
+            else:
+                print(f"Downloading {filename}...")
+
+            await self.rate_limiter.acquire_async('cdn')
+            start = time.perf_counter()
+            async with http.get(media_item.url, headers=headers) as response:
+                self.rate_limiter.on_response('cdn', response.status, response.headers)
+                if response.status == 206:
+                    mode = 'ab'
+                    total = offset + response.content_length if response.content_length is not None else None
+                    digest = hash_file(part)
+                elif response.status == 200:
+                    mode = 'wb'
+                    total = response.content_length
+                    offset = 0
+                    digest = hashlib.sha256()
+                else:
+                    print(f"Failed to download {filename}: HTTP {response.status}")
+                    MEDIA.inc(source='media_item', result='failed')
+                    return False
+                with open(part, mode, buffering=0) as f:
+                    if total is not None and total - offset >= PREALLOCATE_MIN:
+                        preallocate(f.fileno(), offset, total - offset)
+                    async for chunk in response.content.iter_chunked(BUFFER_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        await BANDWIDTH.consume_async(len(chunk))
+
+            size = part.stat().st_size
+            if total is not None and size != total:
+                print(f"Incomplete download of {filename} ({size}/{total} bytes), will resume next run")
+                MEDIA.inc(source='media_item', result='failed')
+                return False
+            os.replace(part, filepath)
+            self._finish_download(media_item, username, filepath, size, digest.hexdigest())
+            self._count_download(size, time.perf_counter() - start)
+            print(f"Successfully downloaded: {filename}")
+            return True
+
+        except Exception as e:
+            print(f"Error downloading {media_item.shortcode}: {str(e)}")
+            MEDIA.inc(source='media_item', result='failed')
+            return False
+
+    def _aiohttp_cookies(self) -> 'aiohttp.CookieJar':
+        """The blocking session's cookies, each kept to its own domain and path"""
+        jar = aiohttp.CookieJar()
+        for cookie in self.session.cookies:
+            morsel = SimpleCookie({cookie.name: cookie.value})[cookie.name]
+            if cookie.domain_specified:
+                morsel['domain'] = cookie.domain
+            morsel['path'] = cookie.path or '/'
+            if cookie.secure:
+                morsel['secure'] = True
+            jar.update_cookies({cookie.name: morsel}, URL(f"https://{cookie.domain.lstrip('.')}/"))
+        return jar
+
+    async def download_profile_async(self, username: str, limit: Optional[int] = None,
+                                     max_concurrency: int = 100, per_host_limit: int = 32,
+                                     queue_size: int = 500, sync: bool = False):
+        """Download all media from a profile on a single asyncio event loop.
+
+        Works like download_profile, but CDN transfers are aiohttp requests sharing one
+        keep-alive pool of max_concurrency connections, at most per_host_limit of them
+        to any single host. Feed enumeration still uses the blocking session and runs
+        in the default executor. Requires the optional aiohttp package.
+
+        Usage: asyncio.run(downloader.download_profile_async("username"))
+        """
+        if aiohttp is None:
+            raise RuntimeError("download_profile_async requires aiohttp (pip install aiohttp)")
+
+        user_dir = self.download_dir / username
+        user_dir.mkdir(exist_ok=True)
+
+        since = self._sync_since(username) if sync else None
+
+        loop = asyncio.get_running_loop()
+        work_queue = asyncio.Queue(maxsize=queue_size)
+        progress = {'found': 0, 'completed': 0, 'skipped': 0, 'failed': 0}
+
+        # Reuse the authenticated identity of the blocking session; aiohttp negotiates its own encodings
+        headers = {k: v for k, v in self.session.headers.items() if k.lower() != 'accept-encoding'}
+        connector = aiohttp.TCPConnector(
+            limit=max_concurrency,
+            limit_per_host=per_host_limit,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+
+        # Shared cookies would go to every host, so the session cookies keep their domains
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers,
+                                         cookie_jar=self._aiohttp_cookies()) as http:
+
+            async def worker():
+                while True:
+                    item = await work_queue.get()
+                    if item is None:
+                        return
+                    success = await self._download_media_item_async(http, item, username)
+                    progress['completed'] += 1
+                    if not success:
+                        progress['failed'] += 1
+                    status = f"Progress: {progress['completed']}/{progress['found']}"
                     if success:
-                        print(f"Progress: {completed}/{total} - Successfully downloaded {item.shortcode}")
+                        print(f"{status} - Successfully downloaded {item.shortcode}")
                     else:
-                        print(f"Progress: {completed}/{total} - Failed to download {item.shortcode}")
-                except Exception as e:
-                    completed += 1
-                    print(f"Progress: {completed}/{total} - Error downloading {item.shortcode}: {str(e)}")
-                
-                # Add a small delay between downloads
-                time.sleep(uniform(0.5, 1.0))
+                        print(f"{status} - Failed to download {item.shortcode}")
+
+            workers = [asyncio.create_task(worker()) for _ in range(max_concurrency)]
+
+            media = iter(self.get_profile_media(username, limit, since=since))
+            try:
+                while True:
+                    # Paging uses blocking requests and rate-limit waits, so keep it off the event loop
+                    item = await loop.run_in_executor(None, next, media, None)
+                    if item is None:
+                        break
+                    progress['found'] += 1
+                    print(f"Found media: {item.shortcode} ({'video' if item.is_video else 'image'})")
+                    await work_queue.put(item)
+            except Exception as e:
+                print(f"Error fetching profile media: {str(e)}")
+            finally:
+                for _ in workers:
+                    await work_queue.put(None)
+                await asyncio.gather(*workers)
+
+        self._update_sync_mark(username, progress['failed'])
+
+        if not progress['found']:
+            print(f"No media items found for user: {username}")
+            return progress
+
+        print(f"\nFinished {progress['completed']}/{progress['found']} media items for {username}")
+        return progress
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,279 @@
+import asyncio
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import uniform
+from typing import Dict, Mapping, Optional
+
+from requests.adapters import HTTPAdapter
+
+from metrics import (BACKOFF_SECONDS, BANDWIDTH_WAIT_SECONDS, HTTP_REQUEST_SECONDS, HTTP_REQUESTS,
+                     RATE_LIMIT_WAIT_SECONDS, THROTTLED)
+
+CDN_HOST_MARKERS = ('cdninstagram.com', 'fbcdn.net')
+
+
+def endpoint_for(url: str) -> str:
+    """Classify a URL as 'cdn' (media files) or 'api' (everything else on Instagram)"""
+    host = urllib.parse.urlsplit(url).hostname or ''
+    return 'cdn' if any(host.endswith(marker) for marker in CDN_HOST_MARKERS) else 'api'
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate can change while it is in use"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available and return 0, otherwise return the seconds to wait before retrying"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until tokens are available; returns the time spent waiting"""
+        waited = 0.0
+        while (wait := self.try_acquire(tokens)) > 0:
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """Wait on the event loop until tokens are available"""
+        waited = 0.0
+        while (wait := self.try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def block_for(self, seconds: float):
+        """Hold back every acquire for the given time and drop any saved-up burst"""
+        with self._lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self._updated = now
+
+
+class AdaptiveRateLimiter:
+    """Shared request pacing for Instagram's API and CDN.
+
+    Each endpoint class has its own token bucket whose rate follows AIMD:
+    every successful response adds increase_step to the rate, every 429/5xx
+    multiplies it by decrease_factor. A Retry-After header blocks the whole
+    endpoint class for the requested time.
+    """
+
+    DEFAULT_LIMITS = {
+        # endpoint: (initial rate, min rate, max rate, burst, additive increase) in requests/second
+        'api': (0.5, 0.05, 2.0, 3, 0.02),
+        'cdn': (10.0, 1.0, 50.0, 20, 0.5),
+    }
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None, decrease_factor: float = 0.5,
+                 max_backoff: float = 300.0):
+        self.limits = dict(self.DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.decrease_factor = decrease_factor
+        self.max_backoff = max_backoff
+        self.buckets = {
+            endpoint: TokenBucket(initial, burst)
+            for endpoint, (initial, _, _, burst, _) in self.limits.items()
+        }
+        self.retry_after: Dict[str, Optional[float]] = {endpoint: None for endpoint in self.limits}
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint: str = 'api') -> float:
+        """Wait for permission to send one request to an endpoint class"""
+        waited = self.buckets[endpoint].acquire()
+        if waited:
+            RATE_LIMIT_WAIT_SECONDS.inc(waited, endpoint=endpoint)
+        return waited
+
+    async def acquire_async(self, endpoint: str = 'api') -> float:
+        waited = await self.buckets[endpoint].acquire_async()
+        if waited:
+            RATE_LIMIT_WAIT_SECONDS.inc(waited, endpoint=endpoint)
+        return waited
+
+    def on_response(self, endpoint: str, status_code: int, headers: Optional[Mapping[str, str]] = None):
+        """Feed a response status back into the endpoint's rate"""
+        HTTP_REQUESTS.inc(endpoint=endpoint, status=status_code)
+        if status_code == 429 or status_code >= 500:
+            retry_after = parse_retry_after((headers or {}).get('Retry-After'))
+            self.on_throttled(endpoint, retry_after)
+        elif status_code < 400:
+            _, _, max_rate, _, step = self.limits[endpoint]
+            bucket = self.buckets[endpoint]
+            with self._lock:
+                bucket.set_rate(min(max_rate, bucket.rate + step))
+                self.retry_after[endpoint] = None
+
+    def on_throttled(self, endpoint: str, retry_after: Optional[float] = None):
+        """Cut the endpoint's rate after a throttling signal or connection failure"""
+        THROTTLED.inc(endpoint=endpoint)
+        _, min_rate, _, _, _ = self.limits[endpoint]
+        bucket = self.buckets[endpoint]
+        with self._lock:
+            bucket.set_rate(max(min_rate, bucket.rate * self.decrease_factor))
+            self.retry_after[endpoint] = retry_after
+        bucket.block_for(retry_after if retry_after is not None else 1.0 / bucket.rate)
+
+    def backoff(self, endpoint: str, attempt: int, base: float = 2.0) -> float:
+        """Sleep before retry number `attempt`, honouring Retry-After when the server sent one"""
+        retry_after = self.retry_after.get(endpoint)
+        if retry_after is not None:
+            wait = min(self.max_backoff, retry_after)
+        else:
+            wait = min(self.max_backoff, base * (2 ** attempt)) * uniform(0.5, 1.0)
+        print(f"Backing off {wait:.1f} seconds before retrying...")
+        BACKOFF_SECONDS.inc(wait, endpoint=endpoint)
+        time.sleep(wait)
+        return wait
+
+    def rate(self, endpoint: str) -> float:
+        return self.buckets[endpoint].rate
+
+
+class BandwidthLimiter:
+    """Cap on downloaded bytes per second, shared by every download worker of the process.
+
+    A token bucket on bytes: rate is the steady bytes/second and burst how
+    many bytes may arrive at once after an idle spell. Chunks are paid for
+    after they are read, so the bucket can go into debt and a chunk bigger
+    than the burst just makes the next reader wait longer. rate None turns
+    the cap off. configure() can change both while downloads are running.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = None
+        self.burst = 0.0
+        self.tokens = 0.0
+        self._updated = time.monotonic()
+        self.configure(rate, burst)
+
+    def configure(self, rate: Optional[float], burst: Optional[float] = None):
+        """Set the rate in bytes/second (None for unlimited) and the burst in bytes (default: one second)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate or None
+            self.burst = burst if burst is not None else (rate or 0.0)
+            self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now: float):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, nbytes: int) -> float:
+        """Take nbytes from the bucket and return how long the caller must wait to stay under the rate"""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            self._refill(time.monotonic())
+            self.tokens -= nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def consume(self, nbytes: int) -> float:
+        """Account for nbytes just read, sleeping as long as the cap requires"""
+        wait = self._reserve(nbytes)
+        if wait:
+            BANDWIDTH_WAIT_SECONDS.inc(wait)
+            time.sleep(wait)
+        return wait
+
+    async def consume_async(self, nbytes: int) -> float:
+        wait = self._reserve(nbytes)
+        if wait:
+            BANDWIDTH_WAIT_SECONDS.inc(wait)
+            await asyncio.sleep(wait)
+        return wait
+
+
+def parse_byte_rate(value: str) -> float:
+    """Bytes per second from a value such as '500000', '800K', '5M' or '1.5G' (decimal units)"""
+    value = value.strip().upper().removesuffix('B/S').removesuffix('B')
+    scale = {'K': 1e3, 'M': 1e6, 'G': 1e9}.get(value[-1:], 1)
+    try:
+        rate = float(value[:-1] if scale != 1 else value) * scale
+    except ValueError:
+        raise ValueError(f"Invalid byte rate {value!r}: use a number of bytes with an optional K, M or G") from None
+    if rate <= 0:
+        raise ValueError("Byte rate must be positive")
+    return rate
+
+
+# Process-wide cap applied in the download write loops; unlimited until configured
+BANDWIDTH = BandwidthLimiter()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """requests adapter that paces every request through an AdaptiveRateLimiter"""
+
+    def __init__(self, limiter: AdaptiveRateLimiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        endpoint = endpoint_for(request.url)
+        self.limiter.acquire(endpoint)
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            HTTP_REQUESTS.inc(endpoint=endpoint, status='error')
+            self.limiter.on_throttled(endpoint)
+            raise
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        self.limiter.on_response(endpoint, response.status_code, response.headers)
+        return response
+
+
+def mount_rate_limiter(session, limiter: AdaptiveRateLimiter, pool_maxsize: int = 32):
+    """Route all of a requests session's traffic through the limiter"""
+    adapter = RateLimitedAdapter(limiter, pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
@@ -0,0 +1,124 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+VALIDATE_URL = 'https://i.instagram.com/api/v1/accounts/current_user/?edit=true'
+
+
+def apply_csrf_header(session: requests.Session):
+    """Point the session's X-CSRFToken header at its csrftoken cookie"""
+    csrf_token = session.cookies.get('csrftoken')
+    if csrf_token:
+        session.headers['X-CSRFToken'] = csrf_token
+
+
+class SessionCache:
+    """Authenticated Instagram cookies saved to disk, one file per account.
+
+    Lets repeated runs (and both the instaloader and the profile downloader
+    clients) reuse one login instead of posting credentials every time.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def path(self, username: str) -> Path:
+        return self.directory / f"{username.lower()}.json"
+
+    def save(self, session: requests.Session, username: str):
+        """Write the session's cookies for username, readable only by the current user"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        cookies = [
+            {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expires': cookie.expires,
+                'secure': cookie.secure,
+            }
+            for cookie in session.cookies
+        ]
+        data = {'username': username, 'saved_at': time.time(), 'cookies': cookies}
+
+        path = self.path(username)
+        tmp = path.with_name(path.name + '.tmp')
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load(self, session: requests.Session, username: str) -> bool:
+        """Load saved cookies into session; False if there is no unexpired saved session"""
+        path = self.path(username)
+        if not path.exists():
+            return False
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable session file {path.name}: {e}")
+            return False
+
+        now = time.time()
+        cookies = [c for c in data.get('cookies', []) if not c.get('expires') or c['expires'] > now]
+        if not any(c['name'] == 'sessionid' for c in cookies):
+            return False
+
+        for cookie in cookies:
+            session.cookies.set(
+                cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'],
+                expires=cookie.get('expires'), secure=cookie.get('secure', False)
+            )
+        apply_csrf_header(session)
+        return True
+
+    def clear(self, username: str):
+        self.path(username).unlink(missing_ok=True)
+
+    @staticmethod
+    def is_valid(session: requests.Session, timeout: float = 20.0) -> Optional[bool]:
+        """Ask Instagram whether the session's cookies still belong to a logged-in user.
+
+        None means the check itself failed (network error, 429 or 5xx), which
+        says nothing about the session.
+        """
+        try:
+            response = session.get(
+                VALIDATE_URL,
+                headers={'X-IG-App-ID': '936619743392459', 'Accept': '*/*'},
+                timeout=timeout,
+                allow_redirects=False
+            )
+        except requests.RequestException:
+            return None
+        if response.status_code in (401, 403) or response.is_redirect:
+            return False  # Logged out, or sent to the login page
+        if response.status_code != 200:
+            return None
+        try:
+            return 'user' in response.json()
+        except ValueError:
+            return False  # A login page instead of the API answer
+
+    def restore(self, session: requests.Session, username: str) -> Optional[bool]:
+        """Load and validate a saved session.
+
+        Returns True if the session is ready to use, False if a saved session
+        was found but rejected (it is deleted), None if nothing was saved. A
+        session that couldn't be checked is kept and used.
+        """
+        if not self.load(session, username):
+            return None
+        valid = self.is_valid(session)
+        if valid is None:
+            print(f"Couldn't verify the saved session of {username}, using it anyway")
+            return True
+        if valid:
+            return True
+        self.clear(username)
+        session.cookies.clear()
+        return False
@@ -0,0 +1,251 @@
+"""Several logged-in Instagram accounts working through one batch.
+
+Instagram budgets API requests per account, so one session caps how fast
+profiles can be enumerated. A SessionPool holds one InstagramProfileDownloader
+per account, each with its own session, AdaptiveRateLimiter and health state,
+all writing into the same download directory and manifest. Work goes to the
+least loaded healthy account; an account that keeps getting 429s is rested
+for a cooldown, and one that hits a checkpoint or loses its login is taken
+out of rotation until someone signs in to it again.
+
+    pool = SessionPool('downloads')
+    pool.login('account_a', password_a)
+    pool.login('account_b', password_b)
+    pool.download_profile('target')
+"""
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from manifest import DownloadManifest
+from media_variants import VariantPolicy
+from metadata_cache import MetadataCache
+from metrics import ACCOUNT_ROTATIONS
+from profile_downloader_v2 import InstagramProfileDownloader
+from rate_limiter import AdaptiveRateLimiter, endpoint_for
+
+T = TypeVar('T')
+
+# Error messages that mean a person has to sign in to the account before it can be used again
+CHECKPOINT_MARKERS = ('checkpoint_required', 'challenge_required', 'login_required', 'feedback_required')
+
+
+class NoHealthyAccounts(RuntimeError):
+    """Every account in the pool has been taken out of rotation"""
+
+
+class Account:
+    """One account of a SessionPool and its health.
+
+    state is 'active', 'cooling' (rested until cooling_until after repeated
+    429s) or 'disabled' (checkpointed or logged out).
+    """
+
+    def __init__(self, username: str, downloader: InstagramProfileDownloader):
+        self.username = username
+        self.downloader = downloader
+        self.state = 'active'
+        self.reason: Optional[str] = None
+        self.cooling_until = 0.0
+        self.cooldowns = 0  # Consecutive cooldowns, each twice as long as the last
+        self.strikes = 0  # 429s since the last successful API response
+        self.in_flight = 0
+        self.last_used = 0.0
+
+    def load(self) -> float:
+        """Tasks in flight relative to the account's current API rate"""
+        return (self.in_flight + 1) / self.downloader.rate_limiter.rate('api')
+
+    def __repr__(self):
+        return f"Account({self.username!r}, {self.state}, in_flight={self.in_flight})"
+
+
+class SessionPool:
+    """Logged-in accounts sharing a download directory, scheduled by load and health"""
+
+    def __init__(self, download_dir: str = 'downloads', variant_policy: Optional[VariantPolicy] = None,
+                 throttle_strikes: int = 3, cooldown: float = 900.0, max_cooldown: float = 4 * 3600.0):
+        self.download_dir = Path(download_dir)
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+        self.variant_policy = variant_policy
+        self.throttle_strikes = throttle_strikes
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.accounts: List[Account] = []
+        self.manifest = DownloadManifest(self.download_dir / 'manifest.db')
+        self.metadata_cache = MetadataCache(self.download_dir / 'metadata_cache.db')
+        self._cond = threading.Condition()
+
+    def new_downloader(self, rate_limiter: Optional[AdaptiveRateLimiter] = None) -> InstagramProfileDownloader:
+        """A downloader with its own session and rate limiter, sharing the pool's manifest and cache"""
+        return InstagramProfileDownloader(str(self.download_dir), rate_limiter=rate_limiter,
+                                          variant_policy=self.variant_policy,
+                                          metadata_cache=self.metadata_cache, manifest=self.manifest)
+
+    def login(self, username: str, password: Optional[str] = None) -> bool:
+        """Sign in an account and add it to the pool.
+
+        Without a password only a saved session is tried.
+        """
+        downloader = self.new_downloader()
+        if password is None:
+            if not downloader.session_cache.restore(downloader.session, username):
+                print(f"No valid saved session for {username}")
+                return False
+            print(f"Reusing saved Instagram session for {username}")
+        elif not downloader.login(username, password):
+            return False
+        self.add(username, downloader)
+        return True
+
+    def add(self, username: str, downloader: InstagramProfileDownloader) -> Account:
+        """Add an already authenticated downloader to the pool and watch its API responses"""
+        account = Account(username, downloader)
+        downloader.session.hooks['response'].append(
+            lambda response, *args, **kwargs: self._on_response(account, response)
+        )
+        with self._cond:
+            self.accounts.append(account)
+            self._cond.notify_all()
+        return account
+
+    def _on_response(self, account: Account, response):
+        """Update an account's health from one of its responses"""
+        if endpoint_for(response.url) != 'api':
+            return
+        status = response.status_code
+        if status == 429:
+            with self._cond:
+                account.strikes += 1
+                if account.strikes >= self.throttle_strikes and account.state == 'active':
+                    retry_after = account.downloader.rate_limiter.retry_after.get('api') or 0.0
+                    self._rotate_out(account, 'cooling', 'throttled', retry_after)
+        elif status in (400, 401, 403):
+            if status == 401 or any(marker in response.text for marker in CHECKPOINT_MARKERS):
+                with self._cond:
+                    if account.state != 'disabled':
+                        self._rotate_out(account, 'disabled', 'checkpoint')
+        elif status < 400:
+            with self._cond:
+                account.strikes = 0
+                if account.state == 'active':
+                    account.cooldowns = 0
+
+    def _rotate_out(self, account: Account, state: str, reason: str, retry_after: float = 0.0):
+        """Take an account out of rotation; called with self._cond held"""
+        account.state = state
+        account.reason = reason
+        ACCOUNT_ROTATIONS.inc(reason=reason)
+        if state == 'cooling':
+            rest = max(retry_after, min(self.max_cooldown, self.cooldown * 2 ** account.cooldowns))
+            account.cooling_until = time.monotonic() + rest
+            account.cooldowns += 1
+            print(f"Account {account.username} keeps getting throttled, resting it for {rest / 60:.1f} minutes")
+        else:
+            print(f"Account {account.username} needs attention ({reason}), taking it out of the pool")
+
+    def _revive(self, now: float):
+        """Put accounts whose cooldown is over back into rotation; called with self._cond held"""
+        for account in self.accounts:
+            if account.state == 'cooling' and account.cooling_until <= now:
+                account.state = 'active'
+                account.reason = None
+                account.strikes = 0
+                print(f"Account {account.username} is back in rotation")
+
+    def acquire(self, timeout: Optional[float] = None) -> Account:
+        """Take the healthy account with the lowest load, waiting while every account is cooling down"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._revive(now)
+                ready = [a for a in self.accounts if a.state == 'active']
+                if ready:
+                    account = min(ready, key=lambda a: (a.load(), a.last_used))
+                    account.in_flight += 1
+                    account.last_used = now
+                    return account
+
+                cooling = [a.cooling_until for a in self.accounts if a.state == 'cooling']
+                if not cooling:
+                    raise NoHealthyAccounts("No usable accounts left in the pool" if self.accounts
+                                            else "The account pool is empty")
+                wait = min(cooling) - now
+                if deadline is not None:
+                    if now >= deadline:
+                        raise TimeoutError("Timed out waiting for an account to come out of its cooldown")
+                    wait = min(wait, deadline - now)
+                self._cond.wait(wait)
+
+    def release(self, account: Account):
+        with self._cond:
+            account.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def account(self, timeout: Optional[float] = None):
+        """Hold an account for the duration of the with-block"""
+        account = self.acquire(timeout)
+        try:
+            yield account
+        finally:
+            self.release(account)
+
+    def run(self, task: Callable[[InstagramProfileDownloader], T],
+            needs_retry: Callable[[T], bool] = lambda result: True) -> T:
+        """Run task on a pooled account's downloader.
+
+        If the account is taken out of rotation while the task runs and
+        needs_retry(result) says the work is unfinished, the task runs again
+        on another account; manifest skips make the rerun cheap.
+        """
+        attempts = max(1, len(self.accounts))
+        for attempt in range(attempts):
+            with self.account() as account:
+                result = task(account.downloader)
+            if account.state == 'active' or attempt == attempts - 1 or not needs_retry(result):
+                return result
+            print(f"Moving unfinished work from {account.username} to another account")
+        return result
+
+    def download_profile(self, username: str, **kwargs) -> Dict:
+        """download_profile on one account, moved to another if that account is rotated out"""
+        return self.run(
+            lambda downloader: downloader.download_profile(username, **kwargs),
+            lambda stats: not stats or bool(stats['failed']) or not stats['complete']
+        )
+
+    def download_post(self, shortcode: str) -> Dict:
+        """download_post_media on one account, retried on another if that account is rotated out"""
+        return self.run(lambda downloader: downloader.download_post_media(shortcode),
+                        lambda result: result['status'] == 'failed')
+
+    def download_posts(self, shortcodes: List[str], max_workers: int = 8,
+                       progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict[str, Dict]:
+        """download_posts with every post scheduled on its own pooled account"""
+        if not self.accounts:
+            raise NoHealthyAccounts("The account pool is empty")
+
+        return self.accounts[0].downloader.download_posts(shortcodes, max_workers, progress_callback,
+                                                          self.download_post)
+
+    @property
+    def usable(self) -> bool:
+        """Whether any account is active or will be once its cooldown ends"""
+        with self._cond:
+            return any(account.state != 'disabled' for account in self.accounts)
+
+    def status(self) -> List[Dict]:
+        """Health of each account, e.g. for a batch summary"""
+        now = time.monotonic()
+        with self._cond:
+            return [{
+                'username': account.username,
+                'state': account.state,
+                'reason': account.reason,
+                'cooling_s': round(max(0.0, account.cooling_until - now)) if account.state == 'cooling' else None,
+                'api_rate': round(account.downloader.rate_limiter.rate('api'), 3),
+            } for account in self.accounts]
@@ -0,0 +1,187 @@
+"""Worker mode: many processes, on any number of hosts, share one job queue.
+
+    python worker.py enqueue targets.txt --queue jobs.db
+    python worker.py run --queue jobs.db --accounts accounts.txt --parallel 2
+    python worker.py status --queue jobs.db
+
+enqueue adds a profile or post job for every line of a targets file (same
+format as cli.py). Every `run` process leases jobs, downloads them with the
+InstagramProfileDownloader pipeline on its own logins, and renews its leases
+with heartbeats; jobs of a worker that dies are picked up by another once
+their lease runs out. Add `run` processes to archive faster.
+"""
+import argparse
+import getpass
+import json
+import os
+import socket
+import sys
+import threading
+from typing import Dict, Set
+
+import metrics
+from cli import add_download_options, apply_download_options, login_pool, read_accounts, read_targets, run_target
+from instagram_downloader_v4 import InstagramDownloader
+from job_queue import Job, JobQueue
+from session_pool import SessionPool
+
+
+class Worker:
+    """Leases jobs from a JobQueue and runs them on a SessionPool, parallel jobs at a time"""
+
+    def __init__(self, queue: JobQueue, pool: SessionPool, args):
+        self.queue = queue
+        self.pool = pool
+        self.args = args
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.held: Set[int] = set()
+        self.stop = threading.Event()
+        self.done = {'ok': 0, 'failed': 0}
+        self._lock = threading.Lock()
+
+    def heartbeats(self):
+        """Renew the leases of running jobs three times per lease period"""
+        while not self.stop.wait(self.args.lease / 3):
+            with self._lock:
+                held = list(self.held)
+            for job_id in held:
+                if not self.queue.heartbeat(job_id, self.owner, self.args.lease):
+                    print(f"Lost the lease on job {job_id}; another worker may be running it")
+
+    def run_job(self, job: Job) -> Dict:
+        print(f"[{self.owner}] {job.kind} {job.target} (attempt {job.attempts})")
+        result = run_target(None, job.kind, job.target, self.args, self.pool)
+        if result['status'] == 'ok' and result.get('complete') is False and not self.args.limit:
+            # The feed stopped early without failed downloads, e.g. a feed request failed; try again later
+            result.update(status='partial', error="Feed was not read to the end")
+        if result['status'] == 'ok':
+            self.queue.complete(job.id, self.owner, result)
+        elif not self.pool.usable:
+            # Not the job's fault: give it back for a worker that still has accounts
+            self.queue.release(job.id, self.owner)
+            print("No usable accounts left, stopping this worker")
+            self.stop.set()
+        else:
+            error = result.get('error') or f"{result.get('failed', 0)} media items failed"
+            self.queue.fail(job.id, self.owner, error, result)
+        return result
+
+    def work(self):
+        while not self.stop.is_set():
+            job = self.queue.lease(self.owner, self.args.lease)
+            if job is None:
+                # Retries waiting out their delay are still 'queued'; without --wait, stop once none are left
+                if not self.args.wait and not self.queue.counts().get('queued'):
+                    return
+                self.stop.wait(self.args.poll)
+                continue
+
+            with self._lock:
+                self.held.add(job.id)
+            try:
+                result = self.run_job(job)
+            except Exception as e:
+                self.queue.fail(job.id, self.owner, str(e))
+                result = {'status': 'failed'}
+            finally:
+                with self._lock:
+                    self.held.discard(job.id)
+            with self._lock:
+                self.done['ok' if result['status'] == 'ok' else 'failed'] += 1
+
+    def run(self) -> Dict:
+        threading.Thread(target=self.heartbeats, daemon=True).start()
+        threads = [threading.Thread(target=self.work, daemon=True) for _ in range(max(1, self.args.parallel))]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1.0)
+        except KeyboardInterrupt:
+            print("Stopping; handing running jobs back to the queue")
+            self.stop.set()
+            with self._lock:
+                held = list(self.held)
+            for job_id in held:
+                self.queue.release(job_id, self.owner)
+        self.stop.set()
+        return self.done
+
+
+def enqueue(args) -> int:
+    queue = JobQueue(args.queue, max_attempts=args.max_attempts)
+    targets = read_targets(args.targets, InstagramDownloader(args.download_dir))
+    added = sum(queue.enqueue(kind, key, args.priority) for kind, key, _ in targets)
+    requeued = sum(queue.requeue(kind, key) for kind, key, _ in targets) if args.requeue else 0
+    print(f"Added {added} jobs, requeued {requeued}, {len(targets) - added - requeued} already known")
+    return 0
+
+
+def status(args) -> int:
+    queue = JobQueue(args.queue)
+    print(json.dumps({'counts': queue.counts(), 'failed': queue.failed()}, indent=2))
+    return 0
+
+
+def run(args) -> int:
+    try:
+        apply_download_options(args)
+    except ValueError as e:
+        print(e)
+        return 2
+
+    if args.accounts:
+        accounts = read_accounts(args.accounts)
+    elif args.username:
+        password = os.environ.get('IG_PASSWORD') or getpass.getpass(f"Password for {args.username}: ")
+        accounts = [(args.username, password)]
+    else:
+        print("--username, IG_USERNAME or --accounts is required")
+        return 2
+
+    pool = login_pool(args, accounts)
+    if not pool:
+        return 2
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+
+    queue = JobQueue(args.queue, retry_delay=args.retry_delay)
+    done = Worker(queue, pool, args).run()
+    print(f"\nWorker finished: {done['ok']} jobs ok, {done['failed']} failed. Queue: {queue.counts()}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Download Instagram profiles and posts from a shared job queue")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('enqueue', help="Add the targets of a file to the queue")
+    add.add_argument('targets', help="File with one profile name, profile URL or post URL per line")
+    add.add_argument('--priority', type=int, default=0, help="Higher priorities are leased first")
+    add.add_argument('--max-attempts', type=int, default=5, help="Attempts per job before it is marked failed")
+    add.add_argument('--requeue', action='store_true', help="Queue targets that are already done or failed again")
+
+    show = commands.add_parser('status', help="Print job counts and failed jobs")
+
+    work = commands.add_parser('run', help="Lease and download jobs until the queue is empty")
+    work.add_argument('--username', default=os.environ.get('IG_USERNAME'), help="Instagram login (or IG_USERNAME)")
+    work.add_argument('--accounts', help="File with one username or username:password per line")
+    work.add_argument('--parallel', type=int, default=2, help="Jobs run at the same time by this worker")
+    add_download_options(work)
+    work.add_argument('--lease', type=float, default=300.0, help="Seconds a job stays leased without a heartbeat")
+    work.add_argument('--retry-delay', type=float, default=60.0, help="Delay before a failed job's first retry")
+    work.add_argument('--wait', action='store_true', help="Keep polling for new jobs instead of exiting")
+    work.add_argument('--poll', type=float, default=10.0, help="Seconds between polls of an empty queue")
+    work.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port")
+
+    for command in (add, show, work):
+        command.add_argument('--queue', default='jobs.db', help="SQLite job queue shared by the workers")
+        command.add_argument('--download-dir', default='downloads', help="Where to save media")
+    args = parser.parse_args(argv)
+
+    return {'enqueue': enqueue, 'status': status, 'run': run}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())